@@ -0,0 +1,68 @@
+"""
+Compare the last benchmark run with the one before it:
+
+    python -m benchmarks.compare [--threshold 0.2] [results.jsonl]
+
+Exits with 1 when the p95 latency of a benchmark grew more than the
+threshold, or when it runs more queries or SQLite statements per
+request than before.
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+
+
+def load_runs(path):
+    # [(commit, date, {name: result})] in the order they were recorded
+    runs = collections.OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                runs.setdefault((result['commit'], result['date']), {})[result['name']] = result
+    return [(commit, date, results) for ((commit, date), results) in runs.items()]
+
+
+def compare(previous, current, threshold):
+    regressions = []
+    for (name, result) in sorted(current.items()):
+        before = previous.get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append('{}: p95 {} ms -> {} ms'.format(name, before['p95_ms'], result['p95_ms']))
+        for counter in ('queries', 'statements'):
+            # runs recorded before a counter existed are not compared on it
+            if counter in result and counter in before and result[counter] > before[counter]:
+                regressions.append('{}: {} -> {} {} per request'.format(
+                    name, before[counter], result[counter], counter))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the last two benchmark runs.')
+    parser.add_argument('results', nargs='?', default=os.path.join(os.path.dirname(__file__), 'results.jsonl'))
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95 growth, 0.2 is 20%%.')
+    args = parser.parse_args(argv)
+
+    runs = load_runs(args.results)
+    if len(runs) < 2:
+        print('Nothing to compare, {} runs recorded.'.format(len(runs)))
+        return 0
+    ((old_commit, old_date, previous), (new_commit, new_date, current)) = runs[-2:]
+    print('Comparing {} ({}) with {} ({})'.format(new_commit, new_date, old_commit, old_date))
+    for (name, result) in sorted(current.items()):
+        print('  {:<24} p50 {:>8} ms  p95 {:>8} ms  p99 {:>8} ms  {:>6} queries  {:>8} statements'.format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result.get('queries', '-'), result['statements']))
+    regressions = compare(previous, current, args.threshold)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
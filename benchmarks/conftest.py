@@ -0,0 +1,141 @@
+"""
+Benchmarks of the hot paths of the blog, run them with:
+
+- pip install pytest-benchmark
+- pytest benchmarks
+
+BENCH_POSTS sets the size of the seeded corpus (10000 by default, try
+100000 or 1000000). BENCH_DATABASE reuses a database seeded before with
+`flask seed-db`, big corpora take a while to build. Every run appends
+its latency percentiles, the queries per request of the views and the
+SQLite statements per request (the ones run by triggers and FTS5
+included) to benchmarks/results.jsonl
+(or BENCH_RESULTS), `python -m benchmarks.compare` checks the last run
+against the previous one.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from flaskr import create_app
+from flaskr.db import ConnectionPool, close_all, get_db, init_db
+from flaskr.seed import SEED_PASSWORD, seed_database
+
+BENCH_POSTS = int(os.environ.get('BENCH_POSTS', 10000))
+BENCH_RESULTS = os.environ.get('BENCH_RESULTS', os.path.join(os.path.dirname(__file__), 'results.jsonl'))
+
+# statements run by every connection of the pools, see counting_connect()
+_statements = {'count': 0}
+
+# {benchmark name: summary} of this run
+_results = {}
+
+
+def counting_connect(connect):
+    def wrapped(self):
+        connection = connect(self)
+        connection.set_trace_callback(lambda statement: _statements.__setitem__('count', _statements['count'] + 1))
+        return connection
+    return wrapped
+
+
+@pytest.fixture(scope='session')
+def bench_app(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('bench') / 'bench.sqlite')
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': path,
+        # the views are measured, not the page cache
+        'PAGE_CACHE': False,
+        # X-SQL-Queries of flaskr.profiler
+        'SQL_PROFILE_HEADERS': True,
+    })
+    if os.environ.get('BENCH_DATABASE'):
+        shutil.copyfile(os.environ['BENCH_DATABASE'], path)
+    else:
+        with app.app_context():
+            init_db()
+            seed_database(posts=BENCH_POSTS)
+    original = ConnectionPool.connect
+    ConnectionPool.connect = counting_connect(original)
+    yield app
+    ConnectionPool.connect = original
+    close_all(app)
+
+
+@pytest.fixture(scope='session')
+def bench_user(bench_app):
+    with bench_app.app_context():
+        return get_db().execute("SELECT username FROM user WHERE username LIKE 'bench%' LIMIT 1").fetchone()[0]
+
+
+@pytest.fixture
+def measure(benchmark, bench_app, request):
+    # measure(get_path, login=False): benchmark GET requests of the path
+    # returned by get_path(), recording percentiles and statements per request
+    def run(get_path, login=False, user=None):
+        client = bench_app.test_client()
+        if login:
+            client.post('/auth/login', data={'username': user, 'password': SEED_PASSWORD})
+        timings = []
+        statements = []
+        queries = []
+
+        def get():
+            path = get_path()
+            count = _statements['count']
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - start)
+            statements.append(_statements['count'] - count)
+            queries.append(int(response.headers.get('X-SQL-Queries', 0)))
+            assert response.status_code in (200, 302), path
+            return response
+
+        benchmark(get)
+        _results[request.node.name] = summarize(timings, statements, queries)
+    return run
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def summarize(timings, statements, queries):
+    return {
+        'rounds': len(timings),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'statements': round(sum(statements) / len(statements), 2),
+        'queries': round(sum(queries) / len(queries), 2),
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    commit = get_commit()
+    run_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    with open(BENCH_RESULTS, 'a') as f:
+        for (name, summary) in sorted(_results.items()):
+            line = dict(commit=commit, date=run_at, posts=BENCH_POSTS, name=name, **summary)
+            f.write(json.dumps(line, sort_keys=True) + '\n')
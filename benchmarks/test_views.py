@@ -0,0 +1,46 @@
+import itertools
+import random
+
+from flaskr.db import get_db
+
+TAGS = ('python', 'flask', 'sqlite', 'career')
+TITLES = ('flask', 'sqlite cache', 'fast python', 'thumbnail')
+
+
+def cycle_post_ids(app, amount=500):
+    # random posts, the same ones in every run
+    with app.app_context():
+        ids = [row[0] for row in get_db().execute('SELECT id FROM post').fetchall()]
+    return itertools.cycle(random.Random(0).sample(ids, min(amount, len(ids))))
+
+
+def test_index(measure):
+    measure(lambda: '/')
+
+
+def test_index_deep_page(measure):
+    measure(lambda: '/?page=50')
+
+
+def test_detail(measure, bench_app):
+    ids = cycle_post_ids(bench_app)
+    measure(lambda: '/{}/detail'.format(next(ids)))
+
+
+def test_filter_tag(measure):
+    tags = itertools.cycle(TAGS)
+    measure(lambda: '/filter_tag?multiple_tags=%23{}'.format(next(tags)))
+
+
+def test_filter_title(measure):
+    titles = itertools.cycle(TITLES)
+    measure(lambda: '/filter_title?title_to_find={}'.format(next(titles)))
+
+
+def test_like(measure, bench_app, bench_user):
+    ids = cycle_post_ids(bench_app)
+    measure(lambda: '/{}/like'.format(next(ids)), login=True, user=bench_user)
+
+
+def test_api_posts(measure):
+    measure(lambda: '/api/v1/posts?fields=id,title')
@@ -15,9 +15,32 @@ from flaskext.markdown import Markdown
 
 APP_CONFIG = {
     "POSTS_PER_PAGE"     : 10,
+    "POSTS_PER_TOPIC"    : 5,
+    "POST_COUNT_TTL"     : 30,
+    "COMMENTS_PER_PAGE"  : 20,
+    "COMMENT_REPLY_DEPTH": 3,
+    "COMMENT_TREE_LIMIT" : 200,
     "POST_IMAGES_FOLDER" : "flaskr/static/post_images",
     "POST_IMAGES_PREFIX" : "static/post_images",
-    "ALLOWED_EXTENSIONS" : {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'}
+    "ALLOWED_EXTENSIONS" : {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'},
+    "MARKDOWN_EXTENSIONS": ['fenced_code'],
+    "BODY_HTML_CACHE_SIZE": 256,
+    "USER_CACHE_SIZE"    : 1024,
+    "USER_CACHE_TTL"     : 60,
+    # bytes of rendered pages kept for anonymous visitors by each worker
+    "PAGE_CACHE_SIZE"    : 32 * 1024 * 1024,
+    "API_MAX_LIMIT"      : 100,
+    "IMAGE_WORKERS"      : 2,
+    "IMAGE_DERIVATIVES_FOLDER": "derived",
+    "IMAGE_DERIVATIVES"  : {"thumb": (84, 84), "web": (1280, 1280)},
+    # files named by their content are cached for good, the others (like
+    # default-post.png or uploads made before) can change in place
+    "IMAGE_MAX_AGE"      : 365 * 24 * 3600,
+    "IMAGE_MUTABLE_MAX_AGE": 3600,
+    "MAX_IMAGE_SIZE"     : 8 * 1024 * 1024,
+    # internal nginx location of the images folder, to answer image requests
+    # with X-Accel-Redirect. For X-Sendfile set USE_X_SENDFILE in config.py
+    "IMAGE_ACCEL_REDIRECT": None,
 }
 
 def create_app(test_config=None):
@@ -26,9 +49,43 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        # requests bigger than an image and the post text are refused
+        # before reading their body
+        MAX_CONTENT_LENGTH=APP_CONFIG["MAX_IMAGE_SIZE"] + 1024 * 1024,
+        # requests read with read-only connections and queue their writes
+        # to the writer thread, which commits them in batches
+        SQLITE_READ_ONLY_REQUESTS=True,
+        WRITE_FLUSH_LATENCY=0.001,
+        WRITE_BATCH_SIZE=100,
+        WRITE_QUEUE_SIZE=1000,
+        WRITE_QUEUE_TIMEOUT=1.0,
+        # cache the pages of anonymous visitors, see flaskr.pagecache
+        PAGE_CACHE=True,
+        # statements slower than this are logged with their query plan and
+        # a statement run this many times in a request is a possible N+1.
+        # SQL_PROFILE_HEADERS adds the counts to responses and
+        # SQL_PROFILE_ROWS also times the rows of loops over cursors (slower),
+        # both on in debug mode
+        SQL_SLOW_QUERY_MS=100,
+        SQL_REPEATED_QUERIES=5,
+        # folder shared by the gunicorn workers, each one writes its metrics
+        # there every METRICS_FLUSH_INTERVAL seconds and /metrics sums them
+        # (the files of stopped workers are merged into one). Without it
+        # /metrics only shows the worker that answers
+        METRICS_DIR=None,
+        METRICS_FLUSH_INTERVAL=10,
+        # online backups copy BACKUP_PAGES pages of the database at a time
+        # and wait BACKUP_PAUSE seconds between them. With BACKUP_INTERVAL
+        # (seconds) a thread of the serving workers backs up on its own,
+        # keeping BACKUP_KEEP of them
+        BACKUP_DIR=os.path.join(app.instance_path, 'backups'),
+        BACKUP_PAGES=1024,
+        BACKUP_PAUSE=0.005,
+        BACKUP_INTERVAL=None,
+        BACKUP_KEEP=7,
     )
     # create the markdown object and instanciate it with the Flask app
-    markdown = Markdown(app, extensions=['fenced_code'])
+    markdown = Markdown(app, extensions=APP_CONFIG["MARKDOWN_EXTENSIONS"])
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -51,12 +108,53 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    # ensure the image derivatives folder exists
+    try:
+        os.makedirs(os.path.join(APP_CONFIG["POST_IMAGES_FOLDER"], APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"]))
+    except OSError:
+        pass
+
     from . import db
     db.init_app(app)
     app.logger.info('DB is running')
 
+    from . import profiler
+    profiler.init_app(app)
+
+    from . import metrics
+    metrics.init_app(app)
+
+    from . import counters
+    counters.init_app(app)
+
+    from . import votes
+    votes.init_app(app)
+
+    from . import search
+    search.init_app(app)
+
+    from . import tags
+    tags.init_app(app)
+
+    from . import render
+    render.init_app(app)
+
+    from . import migrations
+    migrations.init_app(app)
+
+    from . import transfer
+    transfer.init_app(app)
+
+    from . import backup
+    backup.init_app(app)
+
+    from . import seed
+    seed.init_app(app)
+
     from . import auth
     app.register_blueprint(auth.bp)
+    # g.user is loaded on first use, static and image requests skip it
+    app.app_ctx_globals_class = auth.UserGlobals
     app.logger.info('Authentication blueprint is running')
 
     from . import topic
@@ -67,5 +165,9 @@ def create_app(test_config=None):
     app.register_blueprint(blog.bp)
     app.add_url_rule('/', endpoint='index') 
     app.logger.info('Blog blueprint is running')
+
+    from . import api
+    app.register_blueprint(api.bp)
+    app.logger.info('API blueprint is running')
     
     return app
\ No newline at end of file
@@ -0,0 +1,150 @@
+from flask import Blueprint, request
+from flask import current_app as app
+
+from werkzeug.exceptions import HTTPException, abort
+
+import datetime
+import json
+import sqlite3
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the json module is used without it
+    orjson = None
+
+from . __init__ import APP_CONFIG
+from . blog import get_posts, get_post_detail, get_post_version
+from . comments import get_comment_page
+from . feed import get_topic_sections, get_topic_pages, get_posts_by_cursor, get_cursors, decode_cursor
+from . images import get_image_url
+from . pagecache import conditional_page
+from . render import get_body_html
+from . tags import parse_tags, get_posts_by_tags
+from . topic import get_topics
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+@bp.route('/posts', methods=('GET',))
+@conditional_page()
+def posts():
+    limit = get_limit()
+    tags = parse_tags(request.args.get('tags'))
+    if tags:
+        # posts with any (or all, match=all) of the tags, paged by number
+        page = max(request.args.get('page', 1, type=int), 1)
+        rows = get_posts_by_tags(tags, request.args.get('match') == 'all',
+            offset=(page - 1) * limit, limit=limit + 1)
+        return to_response({
+            'posts': serialize_posts(rows[:limit]),
+            'next_page': page + 1 if len(rows) > limit else None,
+        })
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            abort(400, 'Invalid cursor.')
+        (rows, next_cursor, prev_cursor) = get_posts_by_cursor(cursor, limit=limit)
+    else:
+        # first page, one more row tells if there is a next one
+        rows = get_posts(limit=limit + 1)
+        (next_cursor, prev_cursor) = get_cursors(rows[:limit], 1, len(rows) > limit, False)
+        rows = rows[:limit]
+    return to_response({
+        'posts': serialize_posts(rows),
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+    })
+
+@bp.route('/posts/<int:id>', methods=('GET',))
+@conditional_page(lambda id: get_post_version(id))
+def post(id):
+    row = get_post_detail(id)
+    if row is None:
+        abort(404, "Post id {0} doesn't exist.".format(id))
+    post = serialize_post(row)
+    post['body_html'] = get_body_html(id, row['body_html_version'])
+    return to_response({'post': select_fields(post)})
+
+@bp.route('/posts/<int:id>/comments', methods=('GET',))
+@conditional_page(lambda id: get_post_version(id))
+def comments(id):
+    if get_post_version(id) is None:
+        abort(404, "Post id {0} doesn't exist.".format(id))
+    # replies of 'parent', the top level comments by default
+    parent = request.args.get('parent', 0, type=int)
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            abort(400, 'Invalid cursor.')
+    (tree, next_cursor) = get_comment_page(id, parent, cursor)
+    return to_response({'comments': tree, 'next_cursor': next_cursor})
+
+@bp.route('/topics', methods=('GET',))
+@conditional_page()
+def topics():
+    # the grouped feed of the index, each topic paged by 'topic_<id>_page'
+    sections = get_topic_sections(get_topic_pages())
+    feeds = {section['id']: section for section in sections}
+    result = []
+    for topic in get_topics():
+        section = feeds.get(topic['id'])
+        result.append({
+            'id': topic['id'],
+            'name': topic['name'],
+            'page': section['page'] if section else 1,
+            'total': section['total'] if section else 0,
+            'posts': serialize_posts(section['posts'] if section else []),
+        })
+    return to_response({'topics': result})
+
+@bp.errorhandler(HTTPException)
+def error(e):
+    response = to_response({'error': e.description})
+    response.status_code = e.code
+    return response
+
+#####[ API functions ]#########################################################
+
+def get_limit():
+    limit = request.args.get('limit', APP_CONFIG["POSTS_PER_PAGE"], type=int)
+    return min(max(limit, 1), APP_CONFIG["API_MAX_LIMIT"])
+
+def get_fields():
+    # sparse fieldsets, ?fields=id,title returns only those keys of posts
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+def select_fields(post, fields=None):
+    fields = fields if fields is not None else get_fields()
+    if fields is None:
+        return post
+    return {key: value for (key, value) in post.items() if key in fields}
+
+def serialize_post(row):
+    post = dict(row)
+    post['image_url'] = get_image_url(row)
+    post['thumb_url'] = get_image_url(row, 'thumb')
+    return post
+
+def serialize_posts(rows):
+    fields = get_fields()
+    return [select_fields(serialize_post(row), fields) for row in rows]
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+def to_json(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':'))
+
+def to_response(data):
+    app.logger.debug('API response of {}'.format(request.path))
+    return app.response_class(to_json(data), mimetype='application/json')
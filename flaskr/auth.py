@@ -1,11 +1,22 @@
 import functools
 
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for
+    Blueprint, flash, g, has_request_context, redirect, render_template, request, session, url_for
 )
+from flask.ctx import _AppCtxGlobals
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask import current_app as app
+from flaskr.cache import LRUCache
 from flaskr.db import get_db
+from flaskr.writer import execute_write
+
+from . __init__ import APP_CONFIG
+
+# columns of user safe to keep in memory, never the password hash
+USER_CACHE_COLUMNS = ('id', 'username')
+
+# users of the recent requests of this worker, by (database, user id)
+_user_cache = LRUCache(APP_CONFIG["USER_CACHE_SIZE"], ttl=APP_CONFIG["USER_CACHE_TTL"])
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -27,11 +38,10 @@ def register():
             error = 'User {} is already registered.'.format(username)
 
         if error is None:
-            db.execute(
+            execute_write(
                 'INSERT INTO user (username, password) VALUES (?, ?)',
                 (username, generate_password_hash(password))
             )
-            db.commit()
             app.logger.info("User {} registered in DB".format(username))
             return redirect(url_for('auth.login'))
 
@@ -65,16 +75,22 @@ def login():
 
     return render_template('auth/login.html')
 
-@bp.before_app_request
 def load_logged_in_user():
     user_id = session.get('user_id')
 
     if user_id is None:
         g.user = None
     else:
-        g.user = get_db().execute(
-            'SELECT * FROM user WHERE id = ?', (user_id,)
-        ).fetchone()
+        g.user = get_cached_user(user_id)
+    return g.user
+
+class UserGlobals(_AppCtxGlobals):
+    """Flask g that loads g.user the first time a view or template reads it."""
+
+    def __getattr__(self, name):
+        if name == 'user' and has_request_context():
+            return load_logged_in_user()
+        raise AttributeError(name)
 
 @bp.route('/logout')
 def logout():
@@ -88,4 +104,25 @@ def login_required(view):
         if g.user is None:
             return redirect(url_for('auth.login'))
         return view(**kwargs)
-    return wrapped_view
\ No newline at end of file
+    return wrapped_view
+
+#####[ Users functions and APIs ]##############################################
+
+def get_cached_user(id):
+    key = (app.config['DATABASE'], id)
+    user = _user_cache.get(key)
+    if user is None:
+        row = get_db().execute(
+            'SELECT {} FROM user WHERE id = ?'.format(', '.join(USER_CACHE_COLUMNS)), (id,)
+        ).fetchone()
+        if row is None:
+            # a deleted user, the session is no longer valid
+            return None
+        user = dict(row)
+        _user_cache.put(key, user)
+    return user
+
+def invalidate_user(id):
+    # call it after changing or deleting the user, the other workers
+    # see the change once their entry expires (USER_CACHE_TTL)
+    _user_cache.pop((app.config['DATABASE'], id))
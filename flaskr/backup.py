@@ -0,0 +1,271 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+import contextlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, every worker runs its own schedule there
+    fcntl = None
+
+from flaskr.images import get_file_digest, get_thumbnail_name
+from flaskr.transfer import copy_images, iter_folder
+
+from . __init__ import APP_CONFIG
+
+MANIFEST = 'manifest.json'
+DATABASE_FILE = 'flaskr.sqlite'
+IMAGES_FOLDER = 'images'
+
+class BackupScheduler(object):
+    """Backs up the database and images every 'interval' seconds from a
+    daemon thread. The interval counts from the newest backup of the folder,
+    so with several workers (or after a restart) only one backup is made
+    per interval, by the worker holding the lock file of the folder."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='flaskr-backup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def get_delay(self):
+        # seconds until the next backup is due, 0 when it is
+        folder = self.app.config['BACKUP_DIR']
+        backups = get_backups(folder)
+        if not backups:
+            return 0
+        age = time.time() - os.path.getmtime(os.path.join(folder, backups[-1], MANIFEST))
+        return max(self.interval - age, 0)
+
+    def _run(self):
+        with self.app.app_context():
+            delay = self.get_delay()
+            while not self._stop.wait(delay):
+                try:
+                    with backup_lock(app.config['BACKUP_DIR']) as locked:
+                        # another worker may have made it meanwhile
+                        if locked and self.get_delay() == 0:
+                            backup_site()
+                    delay = self.get_delay()
+                except Exception:
+                    app.logger.exception('Scheduled backup failed')
+                    delay = self.interval
+                if delay == 0:
+                    # another worker is backing up, look again in a while
+                    delay = self.interval / 10
+
+#####[ Backup functions and APIs ]#############################################
+
+@contextlib.contextmanager
+def backup_lock(folder):
+    # True when this process got the lock of 'folder', closing the file
+    # releases it
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '.lock'), 'w') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True
+
+def copy_database(source, target, pages, pause):
+    # copy 'pages' pages per step and sleep 'pause' seconds between steps,
+    # so the backup never holds the disk for long. 'source' is in a read
+    # transaction: the copy is the snapshot it started with, and the writes
+    # of the site meanwhile don't restart it
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination, pages=pages,
+                      progress=lambda status, remaining, total: time.sleep(pause))
+        return destination.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        destination.close()
+
+def get_file_entries(folder):
+    for name in sorted(iter_folder(folder)):
+        path = os.path.join(folder, name)
+        yield {'name': name, 'size': os.path.getsize(path), 'sha256': get_file_digest(path)}
+
+def get_missing_images(database, images):
+    # images of the backed up posts that aren't in the backup
+    db = sqlite3.connect(database)
+    try:
+        names = set()
+        for (image, icon) in db.execute('SELECT DISTINCT image, icon FROM post'):
+            names.add(image)
+            if get_thumbnail_name({'icon': icon}):
+                names.add(os.path.join(APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], icon))
+    finally:
+        db.close()
+    return sorted(name for name in names if not os.path.isfile(os.path.join(images, name)))
+
+def backup_site(folder=None, pages=None, pause=None, images=True, verify=True):
+    # write the database, the images and their manifest into a new folder
+    # of BACKUP_DIR. It is named .tmp until complete, an interrupted backup
+    # never looks finished. Run it holding backup_lock of the folder.
+    # Returns the path of the backup
+    folder = folder or app.config['BACKUP_DIR']
+    pages = pages or app.config['BACKUP_PAGES']
+    pause = app.config['BACKUP_PAUSE'] if pause is None else pause
+    name = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(folder, name)
+    index = 1
+    while os.path.exists(path):
+        index += 1
+        path = os.path.join(folder, '{}-{}'.format(name, index))
+    temp_path = path + '.tmp'
+    os.makedirs(temp_path)
+    start = time.monotonic()
+    app.logger.info('Backing up the site into {}'.format(path))
+
+    # a private connection, a long read transaction must not stay in a pool
+    source = sqlite3.connect(app.config['DATABASE'], isolation_level=None)
+    try:
+        # the read transaction starts with the first read
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(1) FROM sqlite_master').fetchone()
+        user_version = source.execute('PRAGMA user_version').fetchone()[0]
+        page_count = copy_database(source, os.path.join(temp_path, DATABASE_FILE), pages, pause)
+        # copied inside the snapshot: an image is stored before the post
+        # that uses it is committed, so every image of the copy is there
+        if images:
+            copy_images(iter_folder(APP_CONFIG["POST_IMAGES_FOLDER"]), APP_CONFIG["POST_IMAGES_FOLDER"],
+                        os.path.join(temp_path, IMAGES_FOLDER))
+    finally:
+        source.close()
+
+    database = os.path.join(temp_path, DATABASE_FILE)
+    manifest = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'database': {
+            'name': DATABASE_FILE,
+            'size': os.path.getsize(database),
+            'sha256': get_file_digest(database),
+            'pages': page_count,
+            'user_version': user_version,
+        },
+        'images': list(get_file_entries(os.path.join(temp_path, IMAGES_FOLDER))) if images else None,
+    }
+    if images:
+        manifest['missing_images'] = get_missing_images(database, os.path.join(temp_path, IMAGES_FOLDER))
+    with open(os.path.join(temp_path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    if verify:
+        errors = verify_backup(temp_path)
+        if errors:
+            raise RuntimeError('The backup {} is damaged: {}'.format(temp_path, '; '.join(errors)))
+    os.replace(temp_path, path)
+    app.logger.info('Backed up the site into {} in {:.1f} s'.format(path, time.monotonic() - start))
+    remove_old_backups(folder, app.config['BACKUP_KEEP'])
+    return path
+
+def verify_backup(path, quick=False):
+    # [error, ...] of the backup folder 'path', empty when it is sound
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    errors = []
+    entries = [dict(manifest['database'])]
+    entries += [dict(entry, name=os.path.join(IMAGES_FOLDER, entry['name'])) for entry in manifest['images'] or ()]
+    for entry in entries:
+        filepath = os.path.join(path, entry['name'])
+        if not os.path.isfile(filepath):
+            errors.append('{} is missing'.format(entry['name']))
+        elif get_file_digest(filepath) != entry['sha256']:
+            errors.append('{} changed'.format(entry['name']))
+    if errors:
+        return errors
+    db = sqlite3.connect(os.path.join(path, DATABASE_FILE))
+    try:
+        result = db.execute('PRAGMA quick_check' if quick else 'PRAGMA integrity_check').fetchall()
+    finally:
+        db.close()
+    if [row[0] for row in result] != ['ok']:
+        errors.extend('database: {}'.format(row[0]) for row in result)
+    return errors
+
+def get_backups(folder):
+    # complete backups, oldest first
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder)
+                  if os.path.isfile(os.path.join(folder, name, MANIFEST)) and not name.endswith('.tmp'))
+
+def remove_old_backups(folder, keep):
+    # run holding backup_lock of 'folder': a .tmp folder then belongs to no
+    # running backup, it was left by one that was stopped
+    if fcntl is not None:
+        for name in os.listdir(folder):
+            if name.endswith('.tmp') and os.path.isdir(os.path.join(folder, name)):
+                app.logger.info('Removing the unfinished backup {}'.format(name))
+                shutil.rmtree(os.path.join(folder, name))
+    if not keep:
+        return
+    for name in get_backups(folder)[:-keep]:
+        app.logger.info('Removing the old backup {}'.format(name))
+        shutil.rmtree(os.path.join(folder, name))
+
+@click.command('backup-db')
+@click.option('--folder', type=click.Path(file_okay=False), default=None,
+              help='Where to write the backup, BACKUP_DIR by default.')
+@click.option('--pages', type=int, default=None, help='Pages copied per step.')
+@click.option('--pause', type=float, default=None, help='Seconds to wait between steps.')
+@click.option('--no-images', is_flag=True, help='Only back up the database.')
+@click.option('--verify', type=click.Path(exists=True, file_okay=False), default=None,
+              help='Only verify this backup.')
+@with_appcontext
+def backup_db_command(folder, pages, pause, no_images, verify):
+    """Back up the database and the post images while the site runs."""
+    if verify:
+        errors = verify_backup(verify)
+        for error in errors:
+            click.echo(error)
+        if errors:
+            raise click.ClickException('The backup is damaged.')
+        click.echo('The backup is sound.')
+        return
+    with backup_lock(folder or app.config['BACKUP_DIR']) as locked:
+        if not locked:
+            raise click.ClickException('Another backup of the folder is running.')
+        try:
+            path = backup_site(folder, pages, pause, images=not no_images)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+    click.echo('Backed up the site into {}.'.format(path))
+
+def get_scheduler(app):
+    # started by the first request of each worker, never by flask commands
+    scheduler = app.extensions.get('flaskr_backup_scheduler')
+    if scheduler is None:
+        with _scheduler_lock:
+            scheduler = app.extensions.get('flaskr_backup_scheduler')
+            if scheduler is None:
+                scheduler = app.extensions['flaskr_backup_scheduler'] = BackupScheduler(
+                    app, app.config['BACKUP_INTERVAL'])
+    return scheduler
+
+_scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    if app.config.get('BACKUP_INTERVAL'):
+        get_scheduler(app._get_current_object())
+
+def init_app(app):
+    app.cli.add_command(backup_db_command)
+    app.before_request(start_scheduler)
@@ -1,5 +1,5 @@
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for, send_from_directory
+    Blueprint, flash, g, jsonify, redirect, render_template, request, url_for, send_from_directory
 )
 from flask import current_app as app
 
@@ -9,19 +9,28 @@ from werkzeug.exceptions import abort
 
 from flaskr.auth import login_required
 from flaskr.db import get_db
-
-import os
-import time
-
-from werkzeug.utils import secure_filename
+from flaskr.writer import write, execute_write
 
 from . __init__ import APP_CONFIG
 from . topic import get_topics
+from . search import search_posts, get_amount_of_search_results
+from . comments import get_comment_page, delete_comment_thread
+from . votes import toggle_vote, LIKE, DISLIKE
+from . pagecache import cached_page, conditional_page
+from . render import render_body, get_body_html
+from . images import save_image_upload, schedule_post_image, get_image_variant, get_image_url, send_image
+from . tags import parse_tags, get_posts_by_tags, get_amount_of_posts_by_tags, get_tag_catalog
+from . feed import (
+    get_topic_sections, get_topic_pages, get_posts_by_cursor, get_cursors, decode_cursor,
+    get_cached_amount_of_posts, invalidate_amount_of_posts
+)
 
 bp = Blueprint('blog', __name__)
 
 @bp.route('/')
 @bp.route('/index')
+@conditional_page()
+@cached_page
 def index():
     # Get arguments from pagination plugin    
     (page, per_page, offset) = get_page_args(page_parameter='page', per_page_parameter='per_page')
@@ -33,85 +42,77 @@ def index():
     except:
         app.logger.error('Problem while parsing page index')
         page = 1
-    # calculate the offset
-    offset = int(APP_CONFIG["POSTS_PER_PAGE"] * (page - 1))
-    # obtain the post in the range page/offset
-    posts = get_posts(limit=APP_CONFIG["POSTS_PER_PAGE"], offset=offset)
-    # get the amount of total posts
-    total = get_amount_of_posts()
+    # get the amount of total posts (cached, it is only used for the links)
+    total = get_cached_amount_of_posts()
+    cursor = request.args.get('cursor')
+    cursor = decode_cursor(cursor) if cursor else None
+    if cursor is not None:
+        # keyset mode, seek from the cursor position instead of skipping rows
+        page = cursor['page']
+        (posts, next_cursor, prev_cursor) = get_posts_by_cursor(
+            cursor, limit=APP_CONFIG["POSTS_PER_PAGE"])
+    else:
+        # calculate the offset
+        offset = int(APP_CONFIG["POSTS_PER_PAGE"] * (page - 1))
+        # obtain the post in the range page/offset
+        posts = get_posts(limit=APP_CONFIG["POSTS_PER_PAGE"], offset=offset)
+        (next_cursor, prev_cursor) = get_cursors(posts, page,
+            has_next=offset + len(posts) < total, has_prev=page > 1)
     # create the pagination object
     pagination = Pagination(page=page, per_page=APP_CONFIG["POSTS_PER_PAGE"], total=total, css_framework='bootstrap4')
+    # build every topic section, each one with its own page, in one query.
+    # Browsing by cursor shows the plain feed of posts instead
+    topic_sections = get_topic_sections(get_topic_pages()) if cursor is None else None
     # pass the info to the template
-
-    topic_dict = {}
-    topics = get_topics()
-    
-    for topic in topics:
-        topic_posts = get_posts_by_topic(topic["id"])
-        if topic_posts:
-            topic_dict[topic["name"]] = topic_posts
-
-    print ("The topic dict is {}".format(topic_dict))
     return render_template('blog/index.html', 
         posts=posts, 
-        posts_tags=get_tags_list(),
-        topic_dict=topic_dict,
+        posts_tags=get_tag_catalog(),
+        topic_sections=topic_sections,
         page=page,
         per_page=APP_CONFIG["POSTS_PER_PAGE"],
         pagination=pagination,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
         )
 
 @bp.route('/filter_tag', methods=('GET',))
+@conditional_page()
+@cached_page
 def filter_tag():
-    db = get_db()
     multiple_tags = request.args.get('multiple_tags')
+    # 'all' keeps the posts with every tag, by default any tag is enough
+    match_all = request.args.get('match') == 'all'
+    tags = parse_tags(multiple_tags)
     # validate arg received
-    if multiple_tags is not "" and multiple_tags is not None and "#" in multiple_tags:
-        # create query that will be aggregated then
-        query = """
-            SELECT p.id, title, tags, created, author_id, username,
-                (SELECT COUNT(1) FROM likes WHERE post_id = p.id) as likes,
-                (SELECT COUNT(1) FROM dislikes WHERE post_id = p.id) AS dislikes 
-            FROM post p 
-            JOIN user u ON p.author_id = u.id 
-            WHERE #tags#  
-            ORDER BY created DESC """
-        # clean up the tags string value
-        multiple_tags = multiple_tags.replace(" ", "").split("#")[1::]
-        # create the string to find coincidences of tags in posts
-        tags_query = ""
-        for tag in multiple_tags:
-            # add content to the tag query
-            tags_query += "instr(tags, '{}') ".format(tag)
-            # if is not las item add and OR statement
-            if tag != multiple_tags[-1]:
-                tags_query += "OR "
-        #replace the tags_query in the query that will be excecuted
-        query = query.replace("#tags#", tags_query)
-        #execute the query
-        posts = db.execute(query).fetchall()
-        multiple_tags = request.args.get('multiple_tags')
-        return render_template('blog/index.html', posts=posts, multiple_tags=multiple_tags, posts_tags=get_tags_list())
+    if tags:
+        (page, per_page, offset) = get_page_args(page_parameter='page', per_page_parameter='per_page')
+        page = page if page > 0 else 1
+        offset = int(APP_CONFIG["POSTS_PER_PAGE"] * (page - 1))
+        # indexed lookup of the tags in post_tags
+        posts = get_posts_by_tags(tags, match_all, offset=offset, limit=APP_CONFIG["POSTS_PER_PAGE"])
+        total = get_amount_of_posts_by_tags(tags, match_all)
+        pagination = Pagination(page=page, per_page=APP_CONFIG["POSTS_PER_PAGE"], total=total, css_framework='bootstrap4')
+        return render_template('blog/index.html', posts=posts, multiple_tags=multiple_tags,
+            match_all=match_all, posts_tags=get_tag_catalog(), pagination=pagination)
     else:
         return redirect(url_for('blog.index'))
 
 @bp.route('/filter_title', methods=('GET',))
+@conditional_page()
+@cached_page
 def filter_title():
-    db = get_db()
     title_to_find = request.args.get('title_to_find')
     # validate arg received
-    if title_to_find is not "" and title_to_find is not None:
-        query = """
-            SELECT p.id, title, tags, created, author_id, username,
-                (SELECT COUNT(1) FROM likes WHERE post_id = p.id) as likes,
-                (SELECT COUNT(1) FROM dislikes WHERE post_id = p.id) AS dislikes 
-            FROM post p 
-            JOIN user u ON p.author_id = u.id 
-            WHERE title LIKE "%{}%"   
-            ORDER BY created DESC """.format(title_to_find)
-        #execute the query
-        posts = db.execute(query).fetchall()
-        return render_template('blog/index.html', posts=posts, posts_tags=get_tags_list(), title_to_find=title_to_find)
+    if title_to_find is not None and title_to_find.strip() != "":
+        (page, per_page, offset) = get_page_args(page_parameter='page', per_page_parameter='per_page')
+        page = page if page > 0 else 1
+        offset = int(APP_CONFIG["POSTS_PER_PAGE"] * (page - 1))
+        # ranked full text search over title, body and tags
+        posts = search_posts(title_to_find, offset=offset, limit=APP_CONFIG["POSTS_PER_PAGE"])
+        total = get_amount_of_search_results(title_to_find)
+        pagination = Pagination(page=page, per_page=APP_CONFIG["POSTS_PER_PAGE"], total=total, css_framework='bootstrap4')
+        return render_template('blog/index.html', posts=posts, posts_tags=get_tag_catalog(),
+            title_to_find=title_to_find, pagination=pagination)
     else:
         return redirect(url_for('blog.index'))
 
@@ -155,28 +156,31 @@ def create():
         if file.filename == '':
             error = 'No selected file'
         if file and is_image_valid_format(file.filename):
-            filename = secure_filename(file.filename)
-            # add timestamp to filename
-            filename = add_timestamp_to_filename(filename)
-            filepath = os.path.join(APP_CONFIG["POST_IMAGES_FOLDER"], filename)
-            file.save(filepath)
-            blob_icon = convert_file_to_binary_data(filepath)
+            # streamed to disk, named by its content
+            (filename, upload_error) = save_image_upload(file)
+            if upload_error is not None:
+                error = upload_error
 
         if error is not None:
             flash(error)
             return redirect(request.url)
         else:
-            db = get_db()
             # TODO: Una opcion podria ser guardar la imagen en la DB,
             # cuando el HTML pida la imagen que la sirva en un directorio temporal
             # de esta manera se puede ir guardando todo en la base y no duplicarlo en el FS
             # REFUTADA porque es una operacion de I/O
-            db.execute(
-                'INSERT INTO post (title, body, author_id, tags, icon, image, topic_id)'
-                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
-                (title, body, g.user['id'], tags, blob_icon, filename, topic_id)
+            # the body is rendered once here, not on every view
+            (body_html, body_html_version) = render_body(body)
+            # the icon references the thumbnail once the background worker made it
+            post_id = execute_write(
+                'INSERT INTO post (title, body, author_id, tags, image, topic_id,'
+                ' body_html, body_html_version)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (title, body, g.user['id'], tags, filename, topic_id,
+                 body_html, body_html_version)
             )
-            db.commit()
+            invalidate_amount_of_posts()
+            schedule_post_image(post_id, filename)
             return redirect(url_for('blog.index'))
 
     return render_template('blog/create.html', topics=get_topics())
@@ -203,27 +207,30 @@ def update(id):
         if file.filename == '' and not post['image']:
             error = 'No selected file or no image uploaded'
         elif file and is_image_valid_format(file.filename):
-            image = secure_filename(file.filename)
-            # add timestamp to filename
-            image = add_timestamp_to_filename(image)
-            #TODO: remove the current image before save new one
-            filepath = os.path.join(APP_CONFIG["POST_IMAGES_FOLDER"], image)
-            file.save(filepath)
-            blob_icon = convert_file_to_binary_data(filepath)
+            # the previous image is kept, other posts could share the same file
+            (image, upload_error) = save_image_upload(file)
+            if upload_error is not None:
+                error = upload_error
+            icon = None
         else:
             image = post['image']
-            blob_icon = post['icon']
+            icon = post['icon']
 
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                'UPDATE post SET title = ?, body = ?, tags = ?, image = ?, icon = ?, topic_id = ?'
+            (body_html, body_html_version) = render_body(body)
+            execute_write(
+                'UPDATE post SET title = ?, body = ?, tags = ?, image = ?, icon = ?, topic_id = ?,'
+                ' body_html = ?, body_html_version = ?'
                 ' WHERE id = ?',
-                (title, body, tags, image, blob_icon, topic_id, id)
+                (title, body, tags, image, icon, topic_id, body_html, body_html_version, id)
             )
-            db.commit()
+            if str(topic_id) != str(post['topic_id']):
+                # the post moved to another section
+                invalidate_amount_of_posts()
+            if image != post['image']:
+                schedule_post_image(id, image)
             return redirect(url_for('blog.index'))
 
     return render_template('blog/update.html', post=post, topics=get_topics())
@@ -233,108 +240,56 @@ def update(id):
 def delete(id):
     app.logger.info('Deleting the post id {}'.format(id))
     get_post(id)
-    db = get_db()
-    db.execute('DELETE FROM post WHERE id = ?', (id,))
-    db.commit()
+    execute_write('DELETE FROM post WHERE id = ?', (id,))
+    invalidate_amount_of_posts()
     return redirect(url_for('blog.index'))
 
 @bp.route('/<int:id>/detail', methods=('GET', ))
+@conditional_page(lambda id: get_post_version(id))
+@cached_page
 def detail(id):
-    db = get_db()
-
-    posts = db.execute(
-        'SELECT p.id, title, tags, body, created, author_id, username,'
-            ' (SELECT COUNT(1) FROM likes WHERE post_id = ?) as likes,'
-            ' (SELECT COUNT(1) FROM dislikes WHERE post_id = ?) AS dislikes '
-        ' FROM post p'
-        ' JOIN user u ON p.author_id = u.id'
-        ' WHERE p.id = ?',
-        (id, id, id)
-    ).fetchall()
-    
-    comments = db.execute(
-        'SELECT u.id as author_id, u.username AS username, c.id AS comment_id, created, body'
-        ' FROM comments c'
-        ' JOIN user u ON c.author_id = u.id'
-        ' WHERE post_id = ? AND repplied_to = 0'
-        ' ORDER BY created DESC',
-        (id,)
-    ).fetchall()
-
-    subcomments = {}
-    for comment in comments:
-        comment_id = int(comment['comment_id'])
-        temp_subcomments = db.execute(
-            'SELECT u.id as author_id, u.username AS username, c.id AS comment_id, created, body'
-            ' FROM comments c'
-            ' JOIN user u ON c.author_id = u.id'
-            ' WHERE repplied_to = ?'
-            ' ORDER BY created ASC',
-            (comment_id,)
-        ).fetchall()
-        subcomments[comment_id] = temp_subcomments
-
-    return render_template('blog/detail.html', posts=posts, comments=comments, subcomments=subcomments)
+    post = get_post_detail(id)
+    posts = [post] if post is not None else []
+    # pre rendered html of the body, from the cache of hot posts if possible
+    body_html = get_body_html(id, posts[0]['body_html_version']) if posts else None
+
+    # only the first page of the thread, the rest is loaded on demand
+    (comments, next_cursor) = get_comment_page(id)
+
+    return render_template('blog/detail.html', posts=posts, body_html=body_html, comments=comments,
+        next_cursor=next_cursor, parent=0, post_id=id,
+        post_author_id=posts[0]['author_id'] if posts else None)
+
+@bp.route('/<int:id>/comments', methods=('GET', ))
+def comments(id):
+    post = get_post(id, check_author=False)
+    # comments replying to 'parent', the top level comments by default
+    parent = request.args.get('parent', 0, type=int)
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            abort(400, 'Invalid cursor.')
+    (comments, next_cursor) = get_comment_page(id, parent, cursor)
+    if request.args.get('format') == 'json':
+        return jsonify(comments=comments, next_cursor=next_cursor)
+    return render_template('blog/comments.html', comments=comments,
+        next_cursor=next_cursor, parent=parent, post_id=id,
+        post_author_id=post['author_id'])
 
 @bp.route('/<int:id>/like', methods=('GET',))
 @login_required
 def like(id):
-    db = get_db()
-    # check if a user did the same like before
-    like_done_before = db.execute(
-        'SELECT COUNT(1)'
-        ' FROM likes'
-        ' WHERE author_id = ? AND post_id = ?', 
-        (g.user['id'], id)
-        ).fetchone()[0]
-    # if like not done before
-    if not like_done_before:
-        db.execute(
-            'INSERT INTO likes'
-            ' (author_id, post_id)'
-            ' VALUES ( ?, ? )', 
-            (g.user['id'], id,)
-        )
-        db.commit()
-    # if not delete the like done
-    else:
-        db.execute(
-            'DELETE FROM likes'
-            ' WHERE author_id = ? AND post_id = ?', 
-            (g.user['id'], id,)
-        )
-        db.commit()
+    # like the post, or remove the like done before
+    write(toggle_vote, id, g.user['id'], LIKE)
     # redirect to detail page
     return redirect(url_for('blog.detail', id=id))
 
 @bp.route('/<int:id>/dislike', methods=('GET',))
 @login_required
 def dislike(id):
-    db = get_db()
-    # check if a user did the same like before
-    dislike_done_before = db.execute(
-        'SELECT COUNT(1)'
-        ' FROM dislikes'
-        ' WHERE author_id = ? AND post_id = ?', 
-        (g.user['id'], id)
-        ).fetchone()[0]
-    # if like not done before
-    if not dislike_done_before:
-        db.execute(
-            'INSERT INTO dislikes'
-            ' (author_id, post_id)'
-            ' VALUES ( ?, ? )', 
-            (g.user['id'], id,)
-        )
-        db.commit()
-    # if not delete the dislike done
-    else:
-        db.execute(
-            'DELETE FROM dislikes'
-            ' WHERE author_id = ? AND post_id = ?', 
-            (g.user['id'], id,)
-        )
-        db.commit()
+    # dislike the post, or remove the dislike done before
+    write(toggle_vote, id, g.user['id'], DISLIKE)
     # redirect to detail page
     return redirect(url_for('blog.detail', id=id))
 
@@ -351,13 +306,11 @@ def comment(id):
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
+            execute_write(
                 'INSERT INTO comments (author_id, post_id, body)'
                 ' VALUES (?, ?, ?)',
                 (g.user['id'], id, body)
             )
-            db.commit()
             return redirect(url_for('blog.detail', id=id))
     else:
         error = 'Invalid HTTP method.'
@@ -382,13 +335,11 @@ def repply(id):
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
+            execute_write(
                 'INSERT INTO comments (author_id, post_id, body, repplied_to)'
                 ' VALUES (?, ?, ?, ?)',
                 (g.user['id'], post_id, repply, id)
             )
-            db.commit()
             return redirect(url_for('blog.detail', id=post_id))
     else:
         error = 'Invalid HTTP method.'
@@ -409,13 +360,8 @@ def uncomment(id):
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                'DELETE FROM comments'
-                ' WHERE id = ?',
-                (id,)
-            )
-            db.commit()
+            # the replies are removed too, they can't be shown without it
+            write(delete_comment_thread, id)
             return redirect(url_for('blog.detail', id=post_id))
     else:
         error = 'Invalid HTTP method.'
@@ -424,20 +370,33 @@ def uncomment(id):
 @bp.route('/<int:id>/image', methods=('GET', ))
 def image(id):
     db = get_db()
-    image_path = db.execute( """
-        SELECT image AS image_path 
+    post = db.execute( """
+        SELECT image, icon
         FROM post  
         WHERE id = ?""",
         (id,)
-    ).fetchall()[0][0]
+    ).fetchone()
+    if post is None:
+        abort(404, "Post id {0} doesn't exist.".format(id))
+    # 'thumb' or 'web' variants, the original if it doesn't exist (yet)
+    image_path = get_image_variant(post, request.args.get('variant'))
     return send_from_directory(APP_CONFIG["POST_IMAGES_PREFIX"], image_path)
 
+@bp.route('/images/<path:filename>', methods=('GET', ))
+def image_file(filename):
+    # fingerprinted url emitted by the templates, cached by browsers for good
+    return send_image(filename)
+
+@bp.app_template_global('image_url')
+def image_url(post, variant=None):
+    return get_image_url(post, variant)
+
 #####[ Posts functions and APIs ]##############################################
 
 def get_post(id, check_author=True):
     app.logger.debug('Getting information of post id: {}'.format(id))
     post = get_db().execute(
-        'SELECT p.id, title, tags, body, created, author_id, username, image, icon'
+        'SELECT p.id, title, tags, body, created, author_id, username, image, icon, topic_id'
         ' FROM post p JOIN user u ON p.author_id = u.id'
         ' WHERE p.id = ?',
         (id,)
@@ -451,126 +410,49 @@ def get_post(id, check_author=True):
 
     return post
 
-def get_post_likes(id):
-    app.logger.debug('Getting post likes of post id: {}'.format(id))
-    db = get_db()
-    # check if a user did the same like before
-    likes = db.execute(
-        'SELECT COUNT(1)'
-        ' FROM likes'
-        ' WHERE post_id = ?', 
-        (id)
-        ).fetchone()[0]
-    return likes
-
-def get_post_dislikes(id):
-    app.logger.debug('Getting post dislikes of post id: {}'.format(id))
-    db = get_db()
-    # check if a user did the same like before
-    dislikes = db.execute(
-        'SELECT COUNT(1)'
-        ' FROM dislikes'
-        ' WHERE post_id = ?', 
-        (id)
-        ).fetchone()[0]
-    return dislikes
-
-def get_tags_list():
-    app.logger.debug("Getting all tags from posts")
-    db = get_db()
-    # get text of tags of each post
-    tags_query = db.execute("SELECT tags FROM post").fetchall()
-    tags = ""
-    for tag in tags_query:
-        # append each tag text into tags variable
-        tags += tag[0]
-    #from appended tags variable, remove spaces and split string
-    #by '#'. After that remove the first element (a white space),
-    #and then create a set to remove repeated values.
-    tags = list(set(tags.replace(" ", "").split("#")[1::]))
-    # add '#' again to each tag after processing
-    tags = ["#" + tag for tag in tags]
-    tags.sort()
-    return tags
+def get_post_detail(id):
+    app.logger.debug('Getting the detail of post id: {}'.format(id))
+    return get_db().execute(
+        'SELECT p.id, title, tags, created, author_id, username, p.image, p.icon, p.topic_id,'
+            ' p.likes_count AS likes, p.dislikes_count AS dislikes,'
+            ' p.comments_count AS comments, p.body_html_version'
+        ' FROM post p'
+        ' JOIN user u ON p.author_id = u.id'
+        ' WHERE p.id = ?',
+        (id,)
+    ).fetchone()
+
+def get_post_version(id):
+    # what the detail page shows of the post, from one indexed row. The body
+    # stamp changes with the body, the counters with votes and the comments
+    # version with any change of its comments
+    post = get_db().execute(
+        'SELECT p.title, p.tags, p.topic_id, p.image, p.icon, p.body_html_version,'
+            ' p.likes_count, p.dislikes_count, p.comments_count, p.comments_version, u.username'
+        ' FROM post p JOIN user u ON p.author_id = u.id'
+        ' WHERE p.id = ?',
+        (id,)
+    ).fetchone()
+    return tuple(post) if post is not None else None
 
 def get_posts(offset=0, limit=APP_CONFIG["POSTS_PER_PAGE"]):
     app.logger.debug("Getting paginated posts from offset {} limit {}".format(offset, limit))
     db = get_db()
-    amount_of_posts = get_amount_of_posts()
-    # check and correct the limit before to execute the query 
-    if offset + limit >= amount_of_posts:
-        limit = int(amount_of_posts - offset)
     posts = db.execute( """
-        SELECT p.id, title, tags, created, author_id, username,
-            (SELECT COUNT(1) FROM likes WHERE post_id = p.id) as likes,
-            (SELECT COUNT(1) FROM dislikes WHERE post_id = p.id) AS dislikes 
+        SELECT p.id, title, tags, created, author_id, username, p.image, p.icon,
+            p.likes_count AS likes,
+            p.dislikes_count AS dislikes 
         FROM post p 
         JOIN user u ON p.author_id = u.id 
-        ORDER BY created DESC 
+        ORDER BY created DESC, p.id DESC 
         LIMIT ? OFFSET ?""",
         (limit, offset)
     ).fetchall()
     return posts
 
-def get_all_posts():
-    app.logger.debug("Getting all posts information")
-    db = get_db()
-    posts = db.execute(
-        'SELECT p.id, title, tags, created, author_id, username,'
-            ' (SELECT COUNT(1) FROM likes WHERE post_id = p.id) as likes,'
-            ' (SELECT COUNT(1) FROM dislikes WHERE post_id = p.id) AS dislikes '
-        ' FROM post p'
-        ' JOIN user u ON p.author_id = u.id'
-        ' ORDER BY created DESC'
-    ).fetchall()
-    return posts
-
-def get_amount_of_posts():
-    db = get_db()
-    posts = db.execute("SELECT COUNT(1) AS amount FROM post").fetchall()[0][0]
-    app.logger.debug("Getting the amount of posts. Total: {}".format(posts))
-    return int(posts)
-
-def get_posts_by_topic(topic_id=None):
-    posts = None
-    if topic_id is not None:
-        app.logger.debug('Getting information of post by topic_id: {}'.format(topic_id))
-        posts = get_db().execute("""
-            SELECT p.id, title, tags, created, author_id, username, 
-                (SELECT COUNT(1) FROM likes WHERE post_id = p.id) as likes, 
-                (SELECT COUNT(1) FROM dislikes WHERE post_id = p.id) AS dislikes  
-            FROM post p 
-            JOIN user u ON p.author_id = u.id 
-            WHERE topic_id = ? 
-            ORDER BY created DESC """,
-            (topic_id,)
-        ).fetchall()
-    else:
-        app.logger.debug('Getting information of post id: {}'.format(id))
-    return posts
-
 #####[ Image utils ]###########################################################
 
 def is_image_valid_format(filename):
     is_valid = '.' in filename and filename.rsplit('.', 1)[1].lower() in APP_CONFIG["ALLOWED_EXTENSIONS"]
     app.logger.debug("{} is valid: {}".format(filename, is_valid))
     return is_valid
-
-def convert_file_to_binary_data(filename):
-    app.logger.debug("Converting '{}' to binary data".format(filename))
-    #Convert digital data to binary format
-    with open(filename, 'rb') as file:
-        blobData = file.read()
-    return blobData
-
-def add_timestamp_to_filename(filename):
-    app.logger.debug("Adding timestamp to '{}' file".format(filename))
-    if filename is not None and filename != "" and "." in filename:
-        timestamp = str(int(time.time()))
-        splitted_filename = filename.split(".")
-        new_filename = splitted_filename[0] + "_" + timestamp + "." + splitted_filename[1]
-        print("The new file is: " + new_filename)
-        return new_filename
-    else:
-        return filename
-    
\ No newline at end of file
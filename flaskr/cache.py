@@ -0,0 +1,75 @@
+import collections
+import threading
+import time
+
+#####[ Cache functions and APIs ]##############################################
+
+class LRUCache(object):
+    """Thread safe LRU cache of this worker, entries expire after 'ttl' seconds if given.
+
+    'size' bounds the amount of entries, or the sum of weigh(value) of the
+    entries when a weigh function is given.
+    """
+
+    def __init__(self, size, ttl=None, weigh=None):
+        self.size = size
+        self.ttl = ttl
+        self.weigh = weigh or (lambda value: 1)
+        self._items = collections.OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                self._stats['misses'] += 1
+                return None
+            (expires, weight, value) = self._items[key]
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                self._stats['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        weight = self.weigh(value)
+        if weight > self.size:
+            return
+        with self._lock:
+            self._remove(key)
+            self._items[key] = (expires, weight, value)
+            self._weight += weight
+            while self._weight > self.size:
+                self._remove(next(iter(self._items)))
+                self._stats['evictions'] += 1
+
+    def pop(self, key):
+        with self._lock:
+            item = self._remove(key)
+        return item[2] if item is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._weight = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._items)
+            stats['weight'] = self._weight
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def _remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._weight -= item[1]
+        return item
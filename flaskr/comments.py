@@ -0,0 +1,120 @@
+from flask import current_app as app
+
+from flaskr.db import get_db
+
+from . __init__ import APP_CONFIG
+from . feed import encode_cursor
+
+#####[ Comments functions and APIs ]###########################################
+
+def get_comment_tree(post_id):
+    app.logger.debug('Getting the comment tree of post id: {}'.format(post_id))
+    # the whole thread in one query, walking the replies from the top level
+    # comments of the post down to any depth
+    rows = get_db().execute("""
+        WITH RECURSIVE thread(id, depth) AS (
+            SELECT id, 0 FROM comments
+            WHERE post_id = ? AND repplied_to = 0
+            UNION ALL
+            SELECT c.id, t.depth + 1 FROM comments c
+            JOIN thread t ON c.repplied_to = t.id
+        )
+        SELECT u.id AS author_id, u.username AS username, c.id AS comment_id,
+            c.repplied_to, c.created, c.body, t.depth
+        FROM thread t
+        JOIN comments c ON c.id = t.id
+        JOIN user u ON c.author_id = u.id
+        ORDER BY t.depth, c.created, c.id""",
+        (post_id,)
+    ).fetchall()
+    return build_comment_tree(rows)
+
+def get_comment_page(post_id, parent_id=0, cursor=None,
+                     limit=APP_CONFIG["COMMENTS_PER_PAGE"],
+                     depth=APP_CONFIG["COMMENT_REPLY_DEPTH"],
+                     max_rows=APP_CONFIG["COMMENT_TREE_LIMIT"]):
+    app.logger.debug('Getting comments of post id {} replying to {} from cursor {}'.format(
+        post_id, parent_id, cursor))
+    # top level comments are shown newest first, replies in the order they were written
+    newest_first = parent_id == 0
+    (order, operator) = ('DESC', '<') if newest_first else ('ASC', '>')
+    keyset = ''
+    params = [post_id, parent_id]
+    if cursor is not None:
+        keyset = 'AND (created, id) {} (?, ?)'.format(operator)
+        params += [cursor['created'], cursor['id']]
+    # one page of comments (and one more to know if there is a next page)
+    # plus their replies up to 'depth' levels, 'max_rows' rows in total
+    # (never fewer than the page). The recursion is breadth first and each
+    # level goes in (created, id) order, so the cut only drops the deepest
+    # rows and the loaded replies of a comment are the first ones, the
+    # replies cursor continues after them
+    max_rows = max(max_rows, limit + 1)
+    rows = get_db().execute("""
+        WITH RECURSIVE page(id, created) AS (
+            SELECT id, created FROM comments
+            WHERE post_id = ? AND repplied_to = ? {0}
+            ORDER BY created {1}, id {1}
+            LIMIT ?
+        ),
+        thread(id, depth, created) AS (
+            SELECT id, 0, created FROM page
+            UNION ALL
+            SELECT c.id, t.depth + 1, c.created FROM comments c
+            JOIN thread t ON c.repplied_to = t.id
+            WHERE t.depth < ?
+            ORDER BY 2, 3, 1
+            LIMIT ?
+        )
+        SELECT u.id AS author_id, u.username AS username, c.id AS comment_id,
+            c.repplied_to, c.created, c.body, t.depth,
+            (SELECT COUNT(1) FROM comments r WHERE r.repplied_to = c.id) AS replies_count
+        FROM thread t
+        JOIN comments c ON c.id = t.id
+        JOIN user u ON c.author_id = u.id
+        ORDER BY t.depth, c.created, c.id""".format(keyset, order),
+        params + [limit + 1, depth, max_rows]
+    ).fetchall()
+    tree = build_comment_tree(rows, newest_first)
+    next_cursor = None
+    if len(tree) > limit:
+        tree = tree[:limit]
+        next_cursor = get_comment_cursor(tree[-1])
+    return tree, next_cursor
+
+def get_comment_cursor(comment):
+    return encode_cursor({'created': comment['created'], 'id': comment['comment_id']}, 'next', 1)
+
+def build_comment_tree(rows, newest_first=True):
+    # rows come sorted by depth, so every parent is seen before its replies
+    nodes = {}
+    tree = []
+    for row in rows:
+        node = dict(row)
+        node['replies'] = []
+        nodes[node['comment_id']] = node
+        if node['depth'] == 0:
+            tree.append(node)
+        else:
+            nodes[node['repplied_to']]['replies'].append(node)
+    # the cursor of the replies that were not loaded, if any
+    for node in nodes.values():
+        node['replies_cursor'] = None
+        if node['replies'] and node.get('replies_count', 0) > len(node['replies']):
+            node['replies_cursor'] = get_comment_cursor(node['replies'][-1])
+    if newest_first:
+        tree.reverse()
+    return tree
+
+def delete_comment_thread(db, id):
+    # writer job, see flaskr.writer
+    app.logger.debug('Deleting comment id {} and its replies'.format(id))
+    db.execute("""
+        WITH RECURSIVE thread(id) AS (
+            SELECT ?
+            UNION ALL
+            SELECT c.id FROM comments c JOIN thread t ON c.repplied_to = t.id
+        )
+        DELETE FROM comments WHERE id IN (SELECT id FROM thread)""",
+        (id,)
+    )
@@ -0,0 +1,59 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db
+
+# counter column of post -> (table, condition) of the rows that are counted
+COUNTERS = {
+    'likes_count': ('votes', 'value = 1'),
+    'dislikes_count': ('votes', 'value = -1'),
+    'comments_count': ('comments', '1'),
+}
+
+#####[ Counters functions and APIs ]###########################################
+
+def rebuild_counters():
+    app.logger.info('Rebuilding the post counters')
+    db = get_db()
+    for column, (table, condition) in COUNTERS.items():
+        db.execute(
+            'UPDATE post SET {0} = ('
+            ' SELECT COUNT(1) FROM {1} WHERE {1}.post_id = post.id AND {2})'.format(
+                column, table, condition)
+        )
+    db.commit()
+
+def verify_counters():
+    # return a (post_id, column, stored, counted) tuple for each wrong counter
+    db = get_db()
+    mismatches = []
+    for column, (table, condition) in COUNTERS.items():
+        rows = db.execute(
+            'SELECT p.id, p.{0} AS stored, COUNT(c.post_id) AS counted'
+            ' FROM post p LEFT JOIN {1} c ON c.post_id = p.id AND {2}'
+            ' GROUP BY p.id'
+            ' HAVING stored != counted'.format(column, table, condition)
+        ).fetchall()
+        for row in rows:
+            mismatches.append((row['id'], column, row['stored'], row['counted']))
+    app.logger.debug('Found {} wrong post counters'.format(len(mismatches)))
+    return mismatches
+
+@click.command('rebuild-counters')
+@click.option('--check', is_flag=True, help='Only verify, do not rebuild.')
+@with_appcontext
+def rebuild_counters_command(check):
+    """Rebuild the like, dislike and comment counters of posts and verify them."""
+    if not check:
+        rebuild_counters()
+        click.echo('Rebuilt the post counters.')
+    mismatches = verify_counters()
+    for post_id, column, stored, counted in mismatches:
+        click.echo('Post {}: {} is {}, expected {}'.format(post_id, column, stored, counted))
+    if mismatches:
+        raise click.ClickException('{} post counters are wrong.'.format(len(mismatches)))
+    click.echo('All post counters are exact.')
+
+def init_app(app):
+    app.cli.add_command(rebuild_counters_command)
@@ -1,24 +1,189 @@
+import os
+import re
 import sqlite3
+import threading
+import weakref
+from urllib.request import pathname2url
 
 import click
-from flask import current_app, g
+from flask import current_app, g, has_request_context
 from flask.cli import with_appcontext
 
+from flaskr.profiler import ProfiledConnection
+
+DEFAULT_PRAGMAS = {
+    # readers don't block the writer and the other way around
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # negative values are KiB
+    'cache_size': -16 * 1024,
+    'busy_timeout': 5000,
+}
+
+SCHEMA_OBJECT = re.compile(r'^CREATE\s+(TABLE|VIRTUAL TABLE|INDEX|TRIGGER)\s+(\w+)', re.IGNORECASE)
+
+class PooledConnection(object):
+    """Holds the connection of a thread in its thread local. When the thread
+    ends its locals are dropped, and the connection is closed with it."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+class ConnectionPool(object):
+    """Keeps one tuned connection per thread, reused by its requests.
+
+    Connections are closed when their thread ends, so servers starting a
+    thread per request don't pile them up. At most 'size' connections are
+    kept, the threads beyond get one that is closed when released."""
+
+    def __init__(self, database, pragmas=None, statement_cache=256, read_only=False, size=32):
+        self.database = database
+        self.pragmas = dict(pragmas if pragmas is not None else DEFAULT_PRAGMAS)
+        self.statement_cache = statement_cache
+        self.read_only = read_only
+        self.size = size
+        if read_only:
+            # the journal mode is set by the writers, a reader can't change it
+            self.pragmas.pop('journal_mode', None)
+        self._local = threading.local()
+        # reentrant, a dropped thread local can close its connection (see
+        # _discard) from whatever code of this thread holds the lock
+        self._lock = threading.RLock()
+        self._connections = set()
+        self._overflow = set()
+        self._stats = {'created': 0, 'acquired': 0, 'rolled_back': 0, 'closed': 0, 'overflow': 0}
+
+    def connect(self):
+        # check_same_thread is off only so close() can run from any thread,
+        # each connection is still used by the thread that created it
+        database = self.database
+        if self.read_only:
+            database = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(database)))
+        connection = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=self.statement_cache,
+            check_same_thread=False,
+            uri=self.read_only,
+            # counts and times the statements of requests, see flaskr.profiler
+            factory=ProfiledConnection
+        )
+        connection.row_factory = sqlite3.Row
+        for (name, value) in self.pragmas.items():
+            connection.execute('PRAGMA {} = {}'.format(name, value))
+        return connection
+
+    def acquire(self):
+        pooled = getattr(self._local, 'pooled', None)
+        if pooled is not None:
+            with self._lock:
+                self._stats['acquired'] += 1
+            return pooled.connection
+        connection = self.connect()
+        with self._lock:
+            self._stats['created'] += 1
+            self._stats['acquired'] += 1
+            if len(self._connections) < self.size:
+                self._connections.add(connection)
+                pooled = self._local.pooled = PooledConnection(connection)
+                weakref.finalize(pooled, self._discard, connection)
+            else:
+                self._overflow.add(connection)
+                self._stats['overflow'] += 1
+        return connection
+
+    def release(self, connection):
+        # a request that failed halfway must not leave its writes pending
+        if connection.in_transaction:
+            connection.rollback()
+            with self._lock:
+                self._stats['rolled_back'] += 1
+        with self._lock:
+            overflow = connection in self._overflow
+            self._overflow.discard(connection)
+        if overflow:
+            self._close(connection)
+
+    def _discard(self, connection):
+        # the thread of the connection ended
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.discard(connection)
+        self._close(connection)
+
+    def _close(self, connection):
+        connection.close()
+        with self._lock:
+            self._stats['closed'] += 1
+
+    def close(self):
+        with self._lock:
+            connections = list(self._connections) + list(self._overflow)
+            self._connections = set()
+            self._overflow = set()
+            (local, self._local) = (self._local, threading.local())
+        del local
+        for connection in connections:
+            self._close(connection)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._connections) + len(self._overflow)
+        stats['reused'] = stats['acquired'] - stats['created']
+        return stats
+
+def get_pool(app=None, read_only=False):
+    app = app or current_app._get_current_object()
+    key = 'flaskr_db_ro_pool' if read_only else 'flaskr_db_pool'
+    pool = app.extensions.get(key)
+    if pool is None:
+        pool = app.extensions[key] = ConnectionPool(
+            app.config['DATABASE'],
+            app.config.get('SQLITE_PRAGMAS'),
+            app.config.get('SQLITE_STATEMENT_CACHE', 256),
+            read_only,
+            app.config.get('SQLITE_POOL_SIZE', 32)
+        )
+    return pool
+
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        # requests only read, their writes go through the writer queue.
+        # The CLI commands and background jobs use read-write connections
+        g.db_read_only = has_request_context() and current_app.config.get('SQLITE_READ_ONLY_REQUESTS', True)
+        g.db = get_pool(read_only=g.db_read_only).acquire()
 
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
+    read_only = g.pop('db_read_only', False)
 
     if db is not None:
-        db.close()
+        pool = get_pool(read_only=read_only)
+        pool.release(db)
+        current_app.logger.debug('DB pool stats: {}'.format(pool.get_stats()))
+
+def get_pool_stats():
+    return {
+        'read_write': get_pool().get_stats(),
+        'read_only': get_pool(read_only=True).get_stats(),
+    }
+
+def close_all(app):
+    # close the pools and stop the writer, backup and metrics threads of
+    # the app, if they were started
+    for key in ('flaskr_writer', 'flaskr_backup_scheduler', 'flaskr_metrics_flusher'):
+        thread = app.extensions.pop(key, None)
+        if thread is not None:
+            thread.stop()
+    for key in ('flaskr_db_pool', 'flaskr_db_ro_pool'):
+        pool = app.extensions.pop(key, None)
+        if pool is not None:
+            pool.close()
 
 def init_db():
     db = get_db()
@@ -26,6 +191,24 @@ def init_db():
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
 
+def get_schema_statements(*names):
+    # the CREATE statements of schema.sql for the named tables, indexes and
+    # triggers, made IF NOT EXISTS so they can run on an existing database
+    statements = {}
+    with current_app.open_resource('schema.sql') as f:
+        statement = ''
+        for line in f.read().decode('utf8').splitlines():
+            if line.startswith('--'):
+                continue
+            statement += line + '\n'
+            if sqlite3.complete_statement(statement):
+                match = SCHEMA_OBJECT.match(statement.strip())
+                if match is not None:
+                    statements[match.group(2)] = SCHEMA_OBJECT.sub(
+                        r'CREATE \1 IF NOT EXISTS \2', statement.strip(), count=1)
+                statement = ''
+    return [statements[name] for name in names]
+
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
@@ -35,4 +218,4 @@ def init_db_command():
 
 def init_app(app):
     app.teardown_appcontext(close_db)
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
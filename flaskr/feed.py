@@ -0,0 +1,173 @@
+from flask import request
+from flask import current_app as app
+
+from flask_paginate import Pagination
+
+import base64
+import json
+import time
+
+from flaskr.db import get_db
+
+from . __init__ import APP_CONFIG
+
+TOPIC_PAGE_PARAMETER = 'topic_{}_page'
+
+# topics read by each statement of get_topic_sections()
+TOPICS_PER_QUERY = 100
+
+# cached total of posts, and of posts of each topic, of each database.
+# Shared by the requests of this worker
+_amount_of_posts = {}
+_topic_totals = {}
+
+#####[ Grouped feed functions and APIs ]#######################################
+
+def get_topic_pages():
+    # collect the per topic page indexes sent as 'topic_<id>_page' arguments
+    topic_pages = {}
+    for key, value in request.args.items():
+        if key.startswith('topic_') and key.endswith('_page'):
+            try:
+                topic_id = int(key[len('topic_'):-len('_page')])
+                page = int(value)
+            except ValueError:
+                app.logger.warning('Invalid topic page argument {}={}'.format(key, value))
+                continue
+            if page > 0:
+                topic_pages[topic_id] = page
+    return topic_pages
+
+def get_topic_sections(topic_pages=None, per_topic=APP_CONFIG["POSTS_PER_TOPIC"]):
+    topic_pages = topic_pages or {}
+    app.logger.debug('Getting topic sections, {} posts per topic, pages {}'.format(
+        per_topic, topic_pages))
+    totals = get_cached_topic_totals()
+    rows = []
+    # one bounded LIMIT/OFFSET walk of post_topic_created per topic, glued
+    # with UNION ALL so a statement serves many sections. SQLite caps the
+    # amount of SELECTs of a compound statement, hence the chunks
+    topic_ids = sorted(totals)
+    for start in range(0, len(topic_ids), TOPICS_PER_QUERY):
+        chunk = topic_ids[start:start + TOPICS_PER_QUERY]
+        params = []
+        for topic_id in chunk:
+            params.extend((topic_id, per_topic, (topic_pages.get(topic_id, 1) - 1) * per_topic))
+        rows.extend(get_db().execute("""
+            SELECT p.id, title, tags, p.created, p.author_id, username, p.image, p.icon,
+                t.id AS topic_id, t.name AS topic_name,
+                p.likes_count AS likes,
+                p.dislikes_count AS dislikes
+            FROM ({}) r
+            JOIN post p ON p.id = r.id
+            JOIN topics t ON t.id = p.topic_id
+            JOIN user u ON p.author_id = u.id
+            ORDER BY t.id, p.created DESC, p.id DESC""".format(' UNION ALL '.join(
+                ['SELECT id FROM (SELECT id FROM post WHERE topic_id = ?'
+                 ' ORDER BY created DESC, id DESC LIMIT ? OFFSET ?)'] * len(chunk))),
+            params
+        ).fetchall())
+    # group the rows (already sorted by topic) into sections
+    sections = []
+    for row in rows:
+        if not sections or sections[-1]['id'] != row['topic_id']:
+            sections.append({
+                'id': row['topic_id'],
+                'name': row['topic_name'],
+                'page': topic_pages.get(row['topic_id'], 1),
+                'total': totals[row['topic_id']],
+                'posts': [],
+            })
+        sections[-1]['posts'].append(row)
+    for section in sections:
+        section['pagination'] = Pagination(
+            page=section['page'],
+            per_page=per_topic,
+            total=section['total'],
+            page_parameter=TOPIC_PAGE_PARAMETER.format(section['id']),
+            css_framework='bootstrap4'
+        )
+    return sections
+
+#####[ Keyset pagination functions and APIs ]#################################
+
+def encode_cursor(post, direction, page):
+    # opaque token that points before (prev) or after (next) the given post
+    data = json.dumps([str(post['created']), post['id'], direction, page])
+    return base64.urlsafe_b64encode(data.encode('utf8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created, id, direction, page = json.loads(data.decode('utf8'))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        app.logger.warning('Invalid pagination cursor {}'.format(token))
+        return None
+    if direction not in ('next', 'prev') or not isinstance(created, str) \
+            or not isinstance(id, int) or not isinstance(page, int) or page <= 0:
+        app.logger.warning('Invalid pagination cursor {}'.format(token))
+        return None
+    return {'created': created, 'id': id, 'direction': direction, 'page': page}
+
+def get_posts_by_cursor(cursor, limit=APP_CONFIG["POSTS_PER_PAGE"]):
+    app.logger.debug('Getting posts by cursor {} limit {}'.format(cursor, limit))
+    # walk the (created, id) index from the cursor position, one extra row
+    # tells if there is another page in the same direction
+    if cursor['direction'] == 'next':
+        condition, order = '(p.created, p.id) < (?, ?)', 'DESC'
+    else:
+        condition, order = '(p.created, p.id) > (?, ?)', 'ASC'
+    posts = get_db().execute("""
+        SELECT p.id, title, tags, created, author_id, username, p.image, p.icon,
+            p.likes_count AS likes,
+            p.dislikes_count AS dislikes
+        FROM post p
+        JOIN user u ON p.author_id = u.id
+        WHERE {0}
+        ORDER BY p.created {1}, p.id {1}
+        LIMIT ?""".format(condition, order),
+        (cursor['created'], cursor['id'], limit + 1)
+    ).fetchall()
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    if cursor['direction'] == 'prev':
+        posts.reverse()
+        has_next, has_prev = True, has_more and cursor['page'] > 1
+    else:
+        has_next, has_prev = has_more, cursor['page'] > 1
+    return (posts,) + get_cursors(posts, cursor['page'], has_next, has_prev)
+
+def get_cursors(posts, page, has_next, has_prev):
+    # return the (next, prev) tokens of the page made by posts
+    next_cursor = prev_cursor = None
+    if posts and has_next:
+        next_cursor = encode_cursor(posts[-1], 'next', page + 1)
+    if posts and has_prev:
+        prev_cursor = encode_cursor(posts[0], 'prev', page - 1)
+    return next_cursor, prev_cursor
+
+def get_cached_amount_of_posts():
+    # the exact total is a full COUNT over post, so it is only refreshed
+    # after POST_COUNT_TTL seconds or when this worker writes a post
+    now = time.time()
+    (value, expires) = _amount_of_posts.get(app.config['DATABASE'], (None, 0))
+    if value is None or expires <= now:
+        value = get_db().execute('SELECT COUNT(1) FROM post').fetchone()[0]
+        _amount_of_posts[app.config['DATABASE']] = (value, now + APP_CONFIG["POST_COUNT_TTL"])
+    return value
+
+def get_cached_topic_totals():
+    # {topic_id: amount of posts}, counted on the post_topic_created index
+    # and kept like the total of posts
+    now = time.time()
+    (totals, expires) = _topic_totals.get(app.config['DATABASE'], (None, 0))
+    if totals is None or expires <= now:
+        totals = dict(get_db().execute(
+            'SELECT topic_id, COUNT(1) FROM post GROUP BY topic_id'
+        ).fetchall())
+        _topic_totals[app.config['DATABASE']] = (totals, now + APP_CONFIG["POST_COUNT_TTL"])
+    return totals
+
+def invalidate_amount_of_posts():
+    _amount_of_posts.pop(app.config['DATABASE'], None)
+    _topic_totals.pop(app.config['DATABASE'], None)
@@ -0,0 +1,221 @@
+from flask import current_app as app
+from flask import request, send_from_directory, url_for
+from werkzeug.exceptions import abort
+from werkzeug.utils import safe_join
+
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it the originals are served
+    Image = None
+
+from flaskr.metrics import increment
+from flaskr.writer import execute_write
+
+from . __init__ import APP_CONFIG
+
+# Pillow releases the GIL while resizing, so threads are enough here
+_executor = ThreadPoolExecutor(max_workers=APP_CONFIG["IMAGE_WORKERS"])
+
+# first bytes of each accepted image format -> extension of the stored file
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}\.\w+$')
+# the originals and their derivatives ('<sha256>_<variant>.<extension>')
+CONTENT_ADDRESSED_FILE = re.compile(r'^[0-9a-f]{64}(_\w+)?\.\w+$')
+
+#####[ Image upload functions and APIs ]#######################################
+
+def get_image_type(head):
+    for (signature, extension) in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def save_image_upload(file, chunk_size=64 * 1024):
+    # copy the upload in chunks into the images folder, hashing it on the
+    # way. Returns (filename, error); the file is named by its sha256, so
+    # the same image is only stored once
+    folder = APP_CONFIG["POST_IMAGES_FOLDER"]
+    max_size = APP_CONFIG["MAX_IMAGE_SIZE"]
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    (fd, temp_path) = tempfile.mkstemp(dir=folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+                if size == 0:
+                    # the content decides the type, not the name of the file
+                    extension = get_image_type(chunk)
+                    if extension is None:
+                        return None, 'The file is not a PNG, JPEG or GIF image.'
+                size += len(chunk)
+                if size > max_size:
+                    return None, 'The image is bigger than {} bytes.'.format(max_size)
+                digest.update(chunk)
+                temp_file.write(chunk)
+        if size == 0:
+            return None, 'No selected file'
+        filename = '{}.{}'.format(digest.hexdigest(), extension)
+        filepath = os.path.join(folder, filename)
+        if os.path.exists(filepath):
+            app.logger.debug('Image {} already stored'.format(filename))
+        else:
+            os.replace(temp_path, filepath)
+            app.logger.debug('Stored image {} of {} bytes'.format(filename, size))
+            increment('flaskr_upload_bytes_total', value=size)
+        return filename, None
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+#####[ Image derivatives functions and APIs ]##################################
+
+def get_file_digest(filepath, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_derivative_name(digest, variant, extension):
+    # named by the content of the original, so the same image is only
+    # processed once and a name never points to other bytes
+    return '{}_{}.{}'.format(digest, variant, extension)
+
+def get_derivative_path(name):
+    return os.path.join(APP_CONFIG["POST_IMAGES_FOLDER"], APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], name)
+
+def create_derivatives(filename):
+    # {variant: derivative name} of the original 'filename' of the images folder
+    if Image is None:
+        app.logger.warning('Pillow is not installed, no derivatives for {}'.format(filename))
+        return {}
+    filepath = os.path.join(APP_CONFIG["POST_IMAGES_FOLDER"], filename)
+    if CONTENT_ADDRESSED_NAME.match(filename):
+        digest = filename.split('.')[0]
+    else:
+        digest = get_file_digest(filepath)
+    derivatives = {}
+    with Image.open(filepath) as original:
+        # the format of the original is kept, only the size changes
+        extension = filename.rsplit('.', 1)[1].lower()
+        for (variant, size) in APP_CONFIG["IMAGE_DERIVATIVES"].items():
+            name = get_derivative_name(digest, variant, extension)
+            derivatives[variant] = name
+            path = get_derivative_path(name)
+            if os.path.exists(path):
+                continue
+            image = original.copy()
+            image.thumbnail(size)
+            if extension in ('jpg', 'jpeg') and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            # write aside and rename, readers never see a partial file
+            temp_path = path + '.tmp'
+            image.save(temp_path, format=original.format, optimize=True)
+            os.replace(temp_path, path)
+    app.logger.debug('Derivatives of {}: {}'.format(filename, derivatives))
+    return derivatives
+
+def process_post_image(flask_app, post_id, filename):
+    with flask_app.app_context():
+        try:
+            derivatives = create_derivatives(filename)
+        except (OSError, ValueError) as e:
+            app.logger.error('Could not create derivatives of {}: {}'.format(filename, e))
+            return
+        if 'thumb' not in derivatives:
+            return
+        # the post could have a new image by now, only update the same one
+        execute_write(
+            'UPDATE post SET icon = ? WHERE id = ? AND image = ?',
+            (derivatives['thumb'], post_id, filename)
+        )
+
+def schedule_post_image(post_id, filename):
+    # create the derivatives in the background, the request doesn't wait
+    return _executor.submit(process_post_image, app._get_current_object(), post_id, filename)
+
+def get_thumbnail_name(post):
+    # name of the thumbnail in the derivatives folder. Posts of the first
+    # schema kept the image bytes in icon, those have no thumbnail
+    icon = post['icon']
+    return icon if isinstance(icon, str) and icon else None
+
+def get_image_variant(post, variant):
+    # file name, inside the images folder, of the variant of the post image
+    thumbnail = get_thumbnail_name(post)
+    if variant == 'thumb' and thumbnail:
+        return os.path.join(APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], thumbnail)
+    if variant in APP_CONFIG["IMAGE_DERIVATIVES"] and thumbnail:
+        name = thumbnail.replace('_thumb.', '_{}.'.format(variant), 1)
+        if os.path.exists(get_derivative_path(name)):
+            return os.path.join(APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], name)
+    return post['image']
+
+#####[ Image serving functions and APIs ]######################################
+
+def get_image_filename(post, variant=None):
+    # path inside the images folder, from the post row alone (no query)
+    if variant == 'thumb' and get_thumbnail_name(post):
+        return '{}/{}'.format(APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], post['icon'])
+    return post['image']
+
+def get_image_url(post, variant=None):
+    # a file name never changes its content, so the url can be cached forever
+    try:
+        filename = get_image_filename(post, variant)
+    except (KeyError, IndexError):
+        # rows without the image columns, resolve it with a query
+        return url_for('blog.image', id=post['id'], variant=variant)
+    return url_for('blog.image_file', filename=filename)
+
+def send_image(filename):
+    immutable = CONTENT_ADDRESSED_FILE.match(os.path.basename(filename)) is not None
+    accel_prefix = APP_CONFIG["IMAGE_ACCEL_REDIRECT"]
+    if accel_prefix:
+        path = safe_join(APP_CONFIG["POST_IMAGES_FOLDER"], filename)
+    else:
+        # the folder send_from_directory() reads
+        path = safe_join(os.path.join(app.root_path, APP_CONFIG["POST_IMAGES_PREFIX"]), filename)
+    if immutable:
+        # the name identifies the content, the etag doesn't need to read the file
+        etag = hashlib.sha1(filename.encode('utf8')).hexdigest()
+    else:
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        stat = os.stat(path)
+        etag = '{:x}-{:x}'.format(int(stat.st_mtime * 1000), stat.st_size)
+    if accel_prefix:
+        # nginx streams the file from its internal location
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix + filename
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+    else:
+        # Range and If-None-Match are answered here, USE_X_SENDFILE in the
+        # app config hands the bytes to the server instead
+        response = send_from_directory(APP_CONFIG["POST_IMAGES_PREFIX"], filename,
+            etag=etag, conditional=True)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = APP_CONFIG["IMAGE_MAX_AGE"]
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = APP_CONFIG["IMAGE_MUTABLE_MAX_AGE"]
+    return response
@@ -0,0 +1,335 @@
+from flask import Blueprint, request
+from flask import current_app as app
+from flask.signals import before_render_template, signals_available, template_rendered
+
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, the files of stopped workers aren't merged there
+    fcntl = None
+
+from flaskr.pagecache import get_page_cache_stats
+from flaskr.profiler import get_profile
+
+bp = Blueprint('metrics', __name__)
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) of every metric
+METRICS = {
+    'flaskr_request_duration_seconds': ('histogram', 'Time to answer a request.'),
+    'flaskr_request_db_seconds': ('histogram', 'Time spent in SQL statements by a request.'),
+    'flaskr_template_render_seconds': ('histogram', 'Time to render a template.'),
+    'flaskr_requests_total': ('counter', 'Answered requests by status code.'),
+    'flaskr_request_errors_total': ('counter', 'Requests that ended with an unhandled exception.'),
+    'flaskr_db_queries_total': ('counter', 'SQL statements run by requests.'),
+    'flaskr_db_rows_total': ('counter', 'Rows fetched by requests.'),
+    'flaskr_upload_bytes_total': ('counter', 'Bytes of stored image uploads.'),
+    'flaskr_page_cache_hits_total': ('counter', 'Pages answered from the page cache.'),
+    'flaskr_page_cache_misses_total': ('counter', 'Pages rendered for the page cache.'),
+}
+
+# buffer of each thread, written only by its thread so no lock is needed to
+# record. The buffers of ended threads are merged into the retired one
+_local = threading.local()
+_buffers = {}
+_retired = {'counters': {}, 'histograms': {}}
+# reentrant, a dropped thread local can retire its buffer (see
+# retire_buffer) from whatever code of this thread holds the lock
+_buffers_lock = threading.RLock()
+
+# the name of the snapshot file of this worker, a new process has its own
+# even if it got the pid of a stopped worker
+_worker = {'pid': None, 'name': None}
+_flush_lock = threading.Lock()
+_flusher_lock = threading.Lock()
+
+# the file the snapshots of stopped workers are merged into
+RETIRED_FILE = 'retired.json'
+
+class ThreadBuffer(object):
+    """Holds the metrics buffer of a thread in its thread local. When the
+    thread ends its locals are dropped, and the buffer is retired with it."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+class MetricsFlusher(object):
+    """Writes the snapshot of this worker into METRICS_DIR every 'interval'
+    seconds from a daemon thread, requests never wait for the file."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='flaskr-metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    flush_snapshot()
+                except Exception:
+                    app.logger.exception('Writing the metrics snapshot failed')
+            # the last counts of a stopping worker
+            flush_snapshot()
+
+#####[ Metrics functions and APIs ]############################################
+
+def get_buffer():
+    holder = getattr(_local, 'holder', None)
+    if holder is None:
+        buffer = {'counters': {}, 'histograms': {}}
+        holder = _local.holder = ThreadBuffer(buffer)
+        with _buffers_lock:
+            _buffers[id(buffer)] = buffer
+        weakref.finalize(holder, retire_buffer, buffer)
+    return holder.buffer
+
+def retire_buffer(buffer):
+    # the thread of 'buffer' ended, its counts stay in the retired buffer
+    with _buffers_lock:
+        merge_snapshot(_retired, buffer)
+        _buffers.pop(id(buffer), None)
+
+def merge_snapshot(target, snapshot):
+    for (key, value) in list(snapshot['counters'].items()):
+        target['counters'][key] = target['counters'].get(key, 0) + value
+    for (key, values) in list(snapshot['histograms'].items()):
+        merged = target['histograms'].setdefault(key, [0] * len(values))
+        for (index, value) in enumerate(values):
+            merged[index] += value
+
+def increment(name, labels=(), value=1):
+    counters = get_buffer()['counters']
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    histograms = get_buffer()['histograms']
+    key = (name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        # a count for each bucket and the +Inf one, then the sum
+        histogram = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+    for (index, bound) in enumerate(buckets):
+        if value <= bound:
+            histogram[index] += 1
+            break
+    else:
+        histogram[len(buckets)] += 1
+    histogram[-1] += value
+
+def get_snapshot():
+    # merge the buffers of every thread of this worker, under the lock so a
+    # retiring buffer is counted once
+    snapshot = {'counters': {}, 'histograms': {}}
+    with _buffers_lock:
+        merge_snapshot(snapshot, _retired)
+        for buffer in list(_buffers.values()):
+            merge_snapshot(snapshot, buffer)
+    cache = get_page_cache_stats()
+    snapshot['counters'][('flaskr_page_cache_hits_total', ())] = cache['hits']
+    snapshot['counters'][('flaskr_page_cache_misses_total', ())] = cache['misses']
+    return snapshot
+
+def encode_snapshot(snapshot):
+    return {kind: [[name, [list(label) for label in labels], value]
+                   for ((name, labels), value) in values.items()]
+            for (kind, values) in snapshot.items()}
+
+def decode_snapshot(data):
+    return {kind: {(name, tuple(tuple(label) for label in labels)): value
+                   for (name, labels, value) in values}
+            for (kind, values) in data.items()}
+
+def get_worker_name():
+    pid = os.getpid()
+    if _worker['pid'] != pid:
+        _worker['name'] = '{}-{}'.format(pid, int(time.time() * 1000))
+        _worker['pid'] = pid
+    return _worker['name']
+
+def get_flusher(app):
+    # started by the first request of each worker
+    flusher = app.extensions.get('flaskr_metrics_flusher')
+    if flusher is None:
+        with _flusher_lock:
+            flusher = app.extensions.get('flaskr_metrics_flusher')
+            if flusher is None:
+                flusher = app.extensions['flaskr_metrics_flusher'] = MetricsFlusher(
+                    app, app.config.get('METRICS_FLUSH_INTERVAL', 10))
+    return flusher
+
+def flush_snapshot():
+    # with METRICS_DIR every worker writes its snapshot there, so the one
+    # scraped can answer for all of them
+    folder = app.config.get('METRICS_DIR')
+    if not folder:
+        return
+    with _flush_lock:
+        path = os.path.join(folder, get_worker_name() + '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(encode_snapshot(get_snapshot()), f)
+        os.replace(path + '.tmp', path)
+
+def is_running(name):
+    # False when the worker of the snapshot file 'name' stopped
+    pid = name.split('-', 1)[0]
+    if not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+@contextlib.contextmanager
+def metrics_lock(folder):
+    # one worker at a time merges the files of stopped ones
+    with open(os.path.join(folder, '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return decode_snapshot(json.load(f))
+    except (OSError, ValueError) as e:
+        app.logger.warning('Skipping the metrics file {}: {}'.format(path, e))
+        return None
+
+def get_aggregated_snapshot():
+    folder = app.config.get('METRICS_DIR')
+    if not folder:
+        return get_snapshot()
+    flush_snapshot()
+    if fcntl is None:
+        return sum_snapshots(glob.glob(os.path.join(folder, '*.json')))
+    with metrics_lock(folder):
+        retire_stopped_workers(folder)
+        return sum_snapshots(glob.glob(os.path.join(folder, '*.json')))
+
+def sum_snapshots(paths):
+    aggregated = {'counters': {}, 'histograms': {}}
+    for path in paths:
+        snapshot = read_snapshot(path)
+        if snapshot is not None:
+            merge_snapshot(aggregated, snapshot)
+    return aggregated
+
+def retire_stopped_workers(folder):
+    # merge the files of stopped workers into RETIRED_FILE, so their counts
+    # don't go back and the folder doesn't grow with every restart
+    retired_path = os.path.join(folder, RETIRED_FILE)
+    stopped = [path for path in glob.glob(os.path.join(folder, '*.json'))
+               if path != retired_path and not is_running(os.path.basename(path)[:-len('.json')])]
+    if not stopped:
+        return
+    retired = (read_snapshot(retired_path) if os.path.exists(retired_path) else None) or \
+        {'counters': {}, 'histograms': {}}
+    for path in stopped:
+        snapshot = read_snapshot(path)
+        if snapshot is not None:
+            merge_snapshot(retired, snapshot)
+    with open(retired_path + '.tmp', 'w') as f:
+        json.dump(encode_snapshot(retired), f)
+    os.replace(retired_path + '.tmp', retired_path)
+    for path in stopped:
+        os.remove(path)
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for (name, value) in labels) + '}'
+
+def render_metrics(snapshot, buckets=LATENCY_BUCKETS):
+    # Prometheus text exposition format
+    lines = []
+    for (name, (kind, description)) in METRICS.items():
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        if kind == 'counter':
+            for ((metric, labels), value) in sorted(snapshot['counters'].items()):
+                if metric == name:
+                    lines.append('{}{} {}'.format(name, format_labels(labels), value))
+            continue
+        for ((metric, labels), values) in sorted(snapshot['histograms'].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for (bound, count) in zip(buckets + ('+Inf',), values[:-1]):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(labels + (('le', bound),)), cumulative))
+            lines.append('{}_sum{} {}'.format(name, format_labels(labels), values[-1]))
+            lines.append('{}_count{} {}'.format(name, format_labels(labels), cumulative))
+    return '\n'.join(lines) + '\n'
+
+@bp.route('/metrics', methods=('GET',))
+def metrics():
+    return app.response_class(render_metrics(get_aggregated_snapshot()),
+        mimetype='text/plain; version=0.0.4')
+
+#####[ Request hooks ]#########################################################
+
+def start_request():
+    _local.start = time.perf_counter()
+
+def finish_request(response):
+    start = getattr(_local, 'start', None)
+    if start is None:
+        return response
+    endpoint = (('endpoint', request.endpoint or 'none'),)
+    observe('flaskr_request_duration_seconds', endpoint, time.perf_counter() - start)
+    increment('flaskr_requests_total', endpoint + (('status', response.status_code),))
+    profile = get_profile()
+    if profile is not None:
+        observe('flaskr_request_db_seconds', endpoint, profile.time)
+        increment('flaskr_db_queries_total', endpoint, profile.count)
+        increment('flaskr_db_rows_total', endpoint, profile.rows)
+    if app.config.get('METRICS_DIR'):
+        get_flusher(app._get_current_object())
+    return response
+
+def count_error(e=None):
+    if e is not None:
+        increment('flaskr_request_errors_total', (('endpoint', request.endpoint or 'none'),))
+    _local.start = None
+
+def start_template(sender, template, context, **extra):
+    _local.template_start = time.perf_counter()
+
+def finish_template(sender, template, context, **extra):
+    start = getattr(_local, 'template_start', None)
+    if start is not None:
+        observe('flaskr_template_render_seconds', (('template', template.name),), time.perf_counter() - start)
+        _local.template_start = None
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(count_error)
+    if signals_available:
+        # blinker is optional in Flask, without it templates aren't timed
+        before_render_template.connect(start_template, app)
+        template_rendered.connect(finish_template, app)
+    if app.config.get('METRICS_DIR'):
+        os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+    app.register_blueprint(bp)
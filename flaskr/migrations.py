@@ -0,0 +1,194 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+import hashlib
+import os
+
+from flaskr.counters import rebuild_counters
+from flaskr.db import get_db, get_schema_statements
+from flaskr.images import get_derivative_name, get_derivative_path, get_image_type
+from flaskr.search import rebuild_search_index
+from flaskr.tags import backfill_post_tags
+from flaskr.votes import VOTES_SCHEMA, has_table, migrate_votes
+
+GENERATION_TRIGGERS = tuple('{}_generation_{}'.format(table, event)
+    for table in ('user', 'post', 'topics', 'votes', 'comments')
+    for event in ('insert', 'update', 'delete'))
+
+#####[ Migration steps ]#######################################################
+
+# Every step only adds tables, columns, indexes and triggers (IF NOT EXISTS)
+# and fills them from the existing rows, nothing is dropped but the merged
+# likes and dislikes tables. The app keeps serving while they run, and a
+# step stopped halfway can run again.
+
+def has_column(db, table, name):
+    return any(row['name'] == name for row in db.execute('PRAGMA table_info({})'.format(table)))
+
+def add_columns(db, table, columns):
+    for (name, definition) in columns:
+        if not has_column(db, table, name):
+            db.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, name, definition))
+
+def create_objects(db, *names):
+    for statement in get_schema_statements(*names):
+        db.execute(statement)
+
+def add_list_indexes(db):
+    create_objects(db, 'post_created', 'post_topic_created', 'comments_post', 'comments_repplied_to')
+
+def add_post_counters(db):
+    add_columns(db, 'post', (
+        ('likes_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('dislikes_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('comments_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ))
+    create_objects(db, 'comments_count_insert', 'comments_count_delete')
+    # the like and dislike counters are filled with the votes table
+    db.execute('UPDATE post SET comments_count = ('
+               ' SELECT COUNT(1) FROM comments WHERE comments.post_id = post.id)')
+
+def add_votes(db):
+    create_objects(db, *VOTES_SCHEMA)
+    if has_table(db, 'likes') and has_table(db, 'dislikes'):
+        migrate_votes()
+    else:
+        rebuild_counters()
+
+def add_search_index(db):
+    create_objects(db, 'post_search', 'post_search_insert', 'post_search_delete', 'post_search_update')
+    rebuild_search_index()
+
+def add_post_tags(db):
+    create_objects(db, 'post_tags', 'post_tags_post', 'post_tags_insert', 'post_tags_delete',
+                   'post_tags_update', 'tag_catalog', 'tag_catalog_version',
+                   'tag_catalog_insert', 'tag_catalog_delete')
+    db.execute('INSERT INTO tag_catalog_version (version)'
+               ' SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM tag_catalog_version)')
+    backfill_post_tags()
+
+def add_body_html(db):
+    # bodies are rendered when first read, or all at once with render-posts
+    add_columns(db, 'post', (('body_html', 'TEXT'), ('body_html_version', 'TEXT')))
+    create_objects(db, 'post_body_html_stale')
+
+def add_data_generation(db):
+    create_objects(db, 'data_generation', *GENERATION_TRIGGERS)
+    db.execute('INSERT INTO data_generation (generation)'
+               ' SELECT abs(random() % 1000000000000)'
+               ' WHERE NOT EXISTS (SELECT 1 FROM data_generation)')
+
+def add_comments_version(db):
+    add_columns(db, 'post', (('comments_version', 'INTEGER NOT NULL DEFAULT 0'),))
+    create_objects(db, 'comments_version_insert', 'comments_version_update', 'comments_version_delete')
+
+def store_legacy_icons(db):
+    # posts of the first schema kept the image bytes in icon, the images
+    # are written out as thumbnails (named by their content like the
+    # others) and the bytes that aren't one are dropped
+    icons = []
+    for (id, icon) in db.execute("SELECT id, icon FROM post WHERE typeof(icon) = 'blob'"):
+        extension = get_image_type(icon)
+        if extension is None:
+            icons.append((None, id))
+            continue
+        name = get_derivative_name(hashlib.sha256(icon).hexdigest(), 'thumb', extension)
+        path = get_derivative_path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(icon)
+            os.replace(path + '.tmp', path)
+        icons.append((name, id))
+    db.executemany('UPDATE post SET icon = ? WHERE id = ?', icons)
+
+# (version, description, step), in the order they are applied. schema.sql
+# stamps new databases with the last version, keep them in step
+MIGRATIONS = [
+    (1, 'Index the post and comment lists', add_list_indexes),
+    (2, 'Store the like, dislike and comment counters of posts', add_post_counters),
+    (3, 'Merge the likes and dislikes into votes', add_votes),
+    (4, 'Full text index of posts', add_search_index),
+    (5, 'Tags of posts and the tag catalog', add_post_tags),
+    (6, 'Store the html of post bodies', add_body_html),
+    (7, 'Generation of the data shown in pages', add_data_generation),
+    (8, 'Version of the comments of posts', add_comments_version),
+    (9, 'Store the image bytes of legacy icons as thumbnails', store_legacy_icons),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+#####[ Migrations functions and APIs ]#########################################
+
+def get_schema_version(db=None):
+    return (db or get_db()).execute('PRAGMA user_version').fetchone()[0]
+
+def get_pending_migrations(version):
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+def restore_deferred_schema(db=None):
+    # create again the indexes and triggers an import dropped (see
+    # flaskr.transfer), then rebuild what those triggers keep. The rows
+    # go last, a restore stopped halfway runs again. Returns their amount
+    db = db or get_db()
+    if not has_table(db, 'deferred_schema'):
+        return 0
+    deferred = db.execute('SELECT name, sql FROM deferred_schema').fetchall()
+    if not deferred:
+        return 0
+    existing = {row[0] for row in db.execute('SELECT name FROM sqlite_master')}
+    for (name, sql) in deferred:
+        if name not in existing:
+            db.execute(sql)
+    db.commit()
+    rebuild_counters()
+    backfill_post_tags()
+    rebuild_search_index()
+    db.execute('DELETE FROM deferred_schema')
+    db.execute('UPDATE data_generation SET generation = generation + 1')
+    db.execute('ANALYZE')
+    db.commit()
+    return len(deferred)
+
+def upgrade_db():
+    # apply the steps newer than the user_version of the database, each one
+    # is committed with its version so an upgrade can stop between them
+    db = get_db()
+    version = get_schema_version(db)
+    if version > LATEST_VERSION:
+        raise RuntimeError('The database is at version {}, newer than this code ({})'.format(
+            version, LATEST_VERSION))
+    restored = restore_deferred_schema(db)
+    if restored:
+        app.logger.warning('Restored {} indexes and triggers left by an interrupted import'.format(restored))
+    applied = []
+    for (number, description, step) in get_pending_migrations(version):
+        app.logger.info('Migrating the database to version {}: {}'.format(number, description))
+        step(db)
+        db.commit()
+        db.execute('PRAGMA user_version = {:d}'.format(number))
+        applied.append((number, description))
+    return applied
+
+@click.command('db-upgrade')
+@click.option('--dry-run', is_flag=True, help='Only list the migrations to apply.')
+@with_appcontext
+def db_upgrade_command(dry_run):
+    """Apply the schema migrations the database is missing, keeping its data."""
+    version = get_schema_version()
+    if dry_run:
+        for (number, description, step) in get_pending_migrations(version):
+            click.echo('{}: {}'.format(number, description))
+        click.echo('The database is at version {} of {}.'.format(version, LATEST_VERSION))
+        return
+    try:
+        applied = upgrade_db()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for (number, description) in applied:
+        click.echo('Applied {}: {}'.format(number, description))
+    click.echo('The database is at version {}.'.format(LATEST_VERSION))
+
+def init_app(app):
+    app.cli.add_command(db_upgrade_command)
@@ -0,0 +1,144 @@
+from flask import current_app as app
+from flask import request, session
+
+import functools
+import hashlib
+import os
+import threading
+
+from flaskr.cache import LRUCache
+from flaskr.db import get_db
+
+from . __init__ import APP_CONFIG
+
+# headers of the response that are never replayed to another visitor
+PRIVATE_HEADERS = ('Set-Cookie',)
+
+# rendered pages of anonymous visitors of this worker, bounded by their size
+_page_cache = LRUCache(APP_CONFIG["PAGE_CACHE_SIZE"], weigh=lambda page: len(page['body']) + 512)
+
+# (connection, data_version, generation) last seen by each thread
+_local = threading.local()
+
+#####[ Page cache functions and APIs ]#########################################
+
+def get_data_generation():
+    # data_version only changes when another connection commits, so the
+    # generation row is read again only after a write of any worker
+    db = get_db()
+    version = db.execute('PRAGMA data_version').fetchone()[0]
+    state = getattr(_local, 'generation', None)
+    if state is None or state[0] is not db or state[1] != version:
+        generation = db.execute('SELECT generation FROM data_generation').fetchone()[0]
+        state = _local.generation = (db, version, generation)
+    return state[2]
+
+def is_cacheable_request():
+    # pages of logged in users, or with flashed messages, are not shared
+    return (request.method == 'GET'
+        and app.config.get('PAGE_CACHE', True)
+        and 'user_id' not in session
+        and '_flashes' not in session)
+
+def get_page_key(generation):
+    # a write bumps the generation, so the stale pages are just never hit
+    # again and leave the cache as the least recently used
+    return (
+        app.config['DATABASE'],
+        generation,
+        request.endpoint,
+        tuple(sorted(request.view_args.items())),
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+def cached_page(view):
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        if not is_cacheable_request():
+            return view(**kwargs)
+        # read before rendering, a write during the render leaves the page
+        # under the previous generation
+        key = get_page_key(get_data_generation())
+        page = _page_cache.get(key)
+        if page is not None:
+            response = app.response_class(page['body'], page['status'], page['headers'])
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        response = app.make_response(view(**kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            _page_cache.put(key, {
+                'body': response.get_data(),
+                'status': response.status_code,
+                'headers': [(name, value) for (name, value) in response.headers
+                            if name not in PRIVATE_HEADERS],
+            })
+        response.headers['X-Cache'] = 'MISS'
+        app.logger.debug('Page cache stats: {}'.format(_page_cache.get_stats()))
+        return response
+    return wrapped_view
+
+def get_page_cache_stats():
+    return _page_cache.get_stats()
+
+def clear_page_cache():
+    _page_cache.clear()
+
+#####[ Conditional GET functions and APIs ]####################################
+
+# newest modification time of the templates, read once per worker
+_templates_stamp = {}
+
+def get_templates_stamp():
+    # a deploy with other templates must not answer 304 to the old pages
+    folder = os.path.join(app.root_path, app.template_folder)
+    if folder not in _templates_stamp:
+        stamp = 0
+        for (root, dirs, files) in os.walk(folder):
+            for name in files:
+                stamp = max(stamp, os.path.getmtime(os.path.join(root, name)))
+        _templates_stamp[folder] = stamp
+    return _templates_stamp[folder]
+
+def get_page_etag(version):
+    # same page, data version and visitor -> same etag, no rendering needed
+    key = repr((
+        version,
+        get_templates_stamp(),
+        session.get('user_id'),
+        request.endpoint,
+        sorted(request.view_args.items()),
+        sorted(request.args.items(multi=True)),
+    ))
+    return hashlib.sha1(key.encode('utf8')).hexdigest()
+
+def conditional_page(get_version=None):
+    # answer 304 when the etag of the page didn't change. get_version(**view
+    # args) returns the version of what the page shows, None to skip the
+    # check (like a missing post); by default the data generation
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return view(**kwargs)
+            version = get_version(**kwargs) if get_version is not None else get_data_generation()
+            if version is None:
+                return view(**kwargs)
+            etag = get_page_etag(version)
+            if request.if_none_match.contains(etag):
+                app.logger.debug('Page {} not modified'.format(request.path))
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # stored by browsers and the CDN, but always revalidated
+            response.cache_control.no_cache = True
+            if 'user_id' in session:
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            response.vary.add('Cookie')
+            return response
+        return wrapped_view
+    return decorator
@@ -0,0 +1,180 @@
+from flask import current_app as app
+from flask import request
+
+import collections
+import functools
+import re
+import sqlite3
+import threading
+import time
+
+# profile of the request served by each thread, None outside of requests
+_local = threading.local()
+
+SHAPE_SPACES = re.compile(r'\s+')
+SHAPE_NUMBERS = re.compile(r'\b\d+\b')
+SHAPE_PLACEHOLDERS = re.compile(r'\?(\s*,\s*\?)*')
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Times and counts the rows fetched with fetchone, fetchmany and
+    fetchall. Stepping through the rows is where SQLite runs most of a
+    query, the time is added to the statement that made the cursor."""
+
+    statement = None
+
+    def _fetched(self, start, rows):
+        profile = getattr(_local, 'profile', None)
+        if profile is not None:
+            profile.fetched(self.statement, time.perf_counter() - start, rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = super().fetchmany(*args, **kwargs)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+class RowProfiledCursor(ProfiledCursor):
+    """Also times the rows of a loop over the cursor. That slows down every
+    row, it is only used with SQL_PROFILE_ROWS."""
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0)
+            raise
+        self._fetched(start, 1)
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    """sqlite3 connection that records its statements in the profile of the running request."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return super().execute(sql, parameters)
+        cursor = self.cursor(RowProfiledCursor if profile.profile_rows else ProfiledCursor)
+        start = time.perf_counter()
+        try:
+            return cursor.execute(sql, parameters)
+        finally:
+            cursor.statement = profile.record(self, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return super().executemany(sql, parameters)
+        cursor = self.cursor()
+        start = time.perf_counter()
+        try:
+            return cursor.executemany(sql, parameters)
+        finally:
+            cursor.statement = profile.record(self, sql, None, time.perf_counter() - start)
+
+class QueryProfile(object):
+    """Statements of one request: amount, time (fetches included), fetched
+    rows and how often each shape ran."""
+
+    def __init__(self, slow_query_time=None, profile_rows=False):
+        self.slow_query_time = slow_query_time
+        self.profile_rows = profile_rows
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+        self.shapes = collections.Counter()
+        self.statements = []
+
+    def record(self, connection, sql, parameters, duration):
+        # the statement the fetches of its cursor add their time to, only
+        # kept to find the slow ones
+        self.count += 1
+        self.time += duration
+        self.shapes[get_statement_shape(sql)] += 1
+        if self.slow_query_time is None:
+            return None
+        statement = [connection, sql, parameters, duration]
+        self.statements.append(statement)
+        return statement
+
+    def fetched(self, statement, duration, rows):
+        self.time += duration
+        self.rows += rows
+        if statement is not None:
+            statement[3] += duration
+
+    def get_slow(self):
+        # (sql, duration, plan) of the statements slower than slow_query_time
+        return [(sql, duration, explain(connection, sql, parameters))
+                for (connection, sql, parameters, duration) in self.statements
+                if duration >= self.slow_query_time]
+
+    def get_repeated(self, threshold):
+        # shapes run 'threshold' times or more, the N+1 candidates
+        return [(shape, count) for (shape, count) in self.shapes.most_common() if count >= threshold]
+
+#####[ SQL profiling functions and APIs ]######################################
+
+@functools.lru_cache(maxsize=1024)
+def get_statement_shape(sql):
+    # the statement without values, the same query with other arguments
+    # (or another amount of IN items) has the same shape
+    shape = SHAPE_SPACES.sub(' ', sql).strip()
+    shape = SHAPE_NUMBERS.sub('N', shape)
+    return SHAPE_PLACEHOLDERS.sub('?+', shape)
+
+def explain(connection, sql, parameters):
+    if parameters is None or not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')):
+        return None
+    try:
+        rows = sqlite3.Connection.execute(connection, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return 'no plan: {}'.format(e)
+    return '\n'.join(row[3] for row in rows)
+
+def get_profile():
+    return getattr(_local, 'profile', None)
+
+def start_profile():
+    slow = app.config.get('SQL_SLOW_QUERY_MS')
+    _local.profile = QueryProfile(slow / 1000.0 if slow is not None else None,
+                                  app.config.get('SQL_PROFILE_ROWS', app.debug))
+
+def finish_profile(response):
+    profile = get_profile()
+    if profile is None:
+        return response
+    for (sql, duration, plan) in profile.get_slow():
+        app.logger.warning('Slow query of {:.1f} ms in {}: {}\n{}'.format(
+            duration * 1000, request.path, SHAPE_SPACES.sub(' ', sql).strip(), plan))
+    for (shape, count) in profile.get_repeated(app.config.get('SQL_REPEATED_QUERIES', 5)):
+        app.logger.warning('Possible N+1 in {}: {} times {}'.format(request.path, count, shape))
+    app.logger.debug('{} ran {} queries in {:.2f} ms'.format(request.path, profile.count, profile.time * 1000))
+    if app.config.get('SQL_PROFILE_HEADERS', app.debug):
+        response.headers['X-SQL-Queries'] = str(profile.count)
+        response.headers['Server-Timing'] = 'db;dur={:.2f};desc="{} queries"'.format(
+            profile.time * 1000, profile.count)
+    return response
+
+def clear_profile(e=None):
+    _local.profile = None
+
+def init_app(app):
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(clear_profile)
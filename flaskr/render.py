@@ -0,0 +1,131 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+from markupsafe import Markup
+
+import collections
+import functools
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import markdown
+
+from flaskr.cache import LRUCache
+from flaskr.db import get_db
+from flaskr.writer import execute_write
+
+from . __init__ import APP_CONFIG
+
+# changes with the Markdown package and its extensions, so bodies rendered
+# with another configuration are rendered again
+RENDERER_VERSION = hashlib.sha1(json.dumps(
+    [markdown.__version__, APP_CONFIG["MARKDOWN_EXTENSIONS"]]
+).encode('utf8')).hexdigest()[:8]
+
+#####[ Markdown render functions and APIs ]####################################
+
+# rendered bodies of the hot posts of this worker, by (post id, stamp)
+_body_cache = LRUCache(APP_CONFIG["BODY_HTML_CACHE_SIZE"])
+
+def render_markdown(body, extensions=APP_CONFIG["MARKDOWN_EXTENSIONS"]):
+    return markdown.markdown(body, extensions=extensions)
+
+def get_body_stamp(body):
+    # renderer version and digest of the source the html was rendered from
+    return '{}:{}'.format(RENDERER_VERSION, hashlib.sha1(body.encode('utf8')).hexdigest()[:12])
+
+def is_stamp_current(stamp):
+    return stamp is not None and stamp.split(':')[0] == RENDERER_VERSION
+
+def render_body(body):
+    # (body_html, body_html_version) to store with the post
+    return render_markdown(body), get_body_stamp(body)
+
+def get_body_html(id, stamp):
+    html = _body_cache.get((id, stamp)) if is_stamp_current(stamp) else None
+    if html is not None:
+        return html
+    db = get_db()
+    post = db.execute(
+        'SELECT body, body_html, body_html_version FROM post WHERE id = ?', (id,)
+    ).fetchone()
+    if post is None:
+        return None
+    (html, stamp) = (post['body_html'], post['body_html_version'])
+    if html is None or stamp != get_body_stamp(post['body']):
+        # written before this renderer version, by raw SQL or from another
+        # body, render it now. Only stored if the body is still this one
+        app.logger.debug('Rendering the body of post id {}'.format(id))
+        (html, stamp) = render_body(post['body'])
+        execute_write(
+            'UPDATE post SET body_html = ?, body_html_version = ? WHERE id = ? AND body = ?',
+            (html, stamp, id, post['body'])
+        )
+    html = Markup(html)
+    _body_cache.put((id, stamp), html)
+    return html
+
+def _render_rows(rows, extensions):
+    # the body goes with its html, a post edited meanwhile is not overwritten
+    return [(render_markdown(body, extensions), get_body_stamp(body), id, body) for (id, body) in rows]
+
+def get_body_batches(render_all=False, batch_size=500):
+    # (id, body) of the posts to render, walking post by id in batches
+    db = get_db()
+    condition = ''
+    if not render_all:
+        condition = "AND (body_html_version IS NULL OR body_html_version NOT LIKE '{}:%')".format(
+            RENDERER_VERSION)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            'SELECT id, body FROM post WHERE id > ? {} ORDER BY id LIMIT ?'.format(condition),
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        yield [tuple(row) for row in rows]
+
+def render_all_bodies(render_all=False, workers=None, batch_size=500):
+    # render the bodies in a process pool, the Markdown parser is pure
+    # Python so threads would not run in parallel
+    db = get_db()
+    workers = workers or os.cpu_count() or 1
+    render = functools.partial(_render_rows, extensions=APP_CONFIG["MARKDOWN_EXTENSIONS"])
+    rendered = 0
+
+    def store(future):
+        cursor = db.executemany(
+            'UPDATE post SET body_html = ?, body_html_version = ? WHERE id = ? AND body = ?',
+            future.result()
+        )
+        db.commit()
+        return cursor.rowcount
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # keep a few batches in flight, not the whole table in memory
+        pending = collections.deque()
+        for batch in get_body_batches(render_all, batch_size):
+            pending.append(executor.submit(render, batch))
+            if len(pending) >= workers * 2:
+                rendered += store(pending.popleft())
+        while pending:
+            rendered += store(pending.popleft())
+    _body_cache.clear()
+    app.logger.info('Rendered the body of {} posts'.format(rendered))
+    return rendered
+
+@click.command('render-posts')
+@click.option('--all', 'render_all', is_flag=True, help='Render every post, not only stale ones.')
+@click.option('--workers', type=int, default=None, help='Amount of render processes.')
+@with_appcontext
+def render_posts_command(render_all, workers):
+    """Render the Markdown body of posts into the body_html cache."""
+    rendered = render_all_bodies(render_all, workers)
+    click.echo('Rendered {} posts.'.format(rendered))
+
+def init_app(app):
+    app.cli.add_command(render_posts_command)
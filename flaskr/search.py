@@ -0,0 +1,86 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+from flaskr.db import get_db
+
+from . __init__ import APP_CONFIG
+
+# markers used by highlight() and snippet(), replaced after escaping the text
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# bm25 weights of the title, body and tags columns
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+#####[ Search functions and APIs ]#############################################
+
+def build_match_query(text):
+    # every word must match, quoted so the user can't write FTS5 syntax.
+    # The last word also matches as a prefix while the user is typing
+    terms = [term.replace('"', '""') for term in text.replace('#', ' ').split()]
+    if not terms:
+        return None
+    terms = ['"{}"'.format(term) for term in terms]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def highlight(text):
+    text = escape(text or '')
+    return Markup(text.replace(HIGHLIGHT_START, Markup('<mark>'))
+                      .replace(HIGHLIGHT_END, Markup('</mark>')))
+
+def search_posts(text, offset=0, limit=APP_CONFIG["POSTS_PER_PAGE"]):
+    app.logger.debug('Searching posts "{}" offset {} limit {}'.format(text, offset, limit))
+    match = build_match_query(text)
+    if match is None:
+        return []
+    rows = get_db().execute("""
+        SELECT p.id, p.title, p.tags, created, author_id, username, p.image, p.icon,
+            p.likes_count AS likes,
+            p.dislikes_count AS dislikes,
+            highlight(post_search, 0, ?, ?) AS title_html,
+            snippet(post_search, -1, ?, ?, '...', 16) AS snippet
+        FROM post_search s
+        JOIN post p ON p.id = s.rowid
+        JOIN user u ON p.author_id = u.id
+        WHERE post_search MATCH ?
+        ORDER BY bm25(post_search, ?, ?, ?)
+        LIMIT ? OFFSET ?""",
+        (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, match)
+        + SEARCH_WEIGHTS + (limit, offset)
+    ).fetchall()
+    posts = []
+    for row in rows:
+        post = dict(row)
+        post['title_html'] = highlight(row['title_html'])
+        post['snippet'] = highlight(row['snippet'])
+        posts.append(post)
+    return posts
+
+def get_amount_of_search_results(text):
+    match = build_match_query(text)
+    if match is None:
+        return 0
+    return get_db().execute(
+        'SELECT COUNT(1) FROM post_search WHERE post_search MATCH ?',
+        (match,)
+    ).fetchone()[0]
+
+def rebuild_search_index():
+    app.logger.info('Rebuilding the posts search index')
+    db = get_db()
+    db.execute("INSERT INTO post_search (post_search) VALUES ('rebuild')")
+    db.execute("INSERT INTO post_search (post_search) VALUES ('optimize')")
+    db.commit()
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Rebuild the full text index of posts from the post table."""
+    rebuild_search_index()
+    click.echo('Rebuilt the search index.')
+
+def init_app(app):
+    app.cli.add_command(rebuild_search_command)
@@ -0,0 +1,139 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+
+import datetime
+import random
+
+from flaskr.db import get_db
+from flaskr.render import render_body
+
+WORDS = (
+    'flask', 'python', 'sqlite', 'query', 'index', 'cache', 'template', 'request',
+    'server', 'worker', 'thread', 'process', 'memory', 'disk', 'network', 'latency',
+    'page', 'post', 'comment', 'topic', 'user', 'vote', 'image', 'thumbnail',
+    'the', 'a', 'of', 'and', 'to', 'in', 'with', 'for', 'on', 'is', 'fast', 'slow',
+    'simple', 'better', 'every', 'some', 'many', 'first', 'last', 'new', 'old',
+)
+
+TAGS = (
+    'python', 'flask', 'sqlite', 'web', 'performance', 'database', 'css', 'html',
+    'javascript', 'linux', 'docker', 'testing', 'security', 'design', 'news',
+    'tutorial', 'release', 'opinion', 'howto', 'career',
+)
+
+SEED_PASSWORD = 'bench'
+
+#####[ Seed functions and APIs ]###############################################
+
+def make_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for i in range(words))
+
+def make_body(rng):
+    paragraphs = ['## {}'.format(make_text(rng, 4).capitalize())]
+    for i in range(rng.randint(2, 6)):
+        paragraphs.append(make_text(rng, rng.randint(20, 80)).capitalize() + '.')
+    if rng.random() < 0.3:
+        paragraphs.append('```\n{}\n```'.format(make_text(rng, 8)))
+    return '\n\n'.join(paragraphs)
+
+def format_time(value):
+    # same text as CURRENT_TIMESTAMP
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def get_next_id(db, table):
+    return db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM {}'.format(table)).fetchone()[0]
+
+def seed_database(posts=10000, users=None, topics=20, votes_per_post=5,
+                  comments_per_post=3, seed=0, batch_size=5000):
+    # add a synthetic corpus to the database, the same seed gives the same
+    # data. Posts spread over three years, tags and votes follow a skewed
+    # distribution and about a third of the comments are replies
+    rng = random.Random(seed)
+    users = users or max(posts // 50, 10)
+    db = get_db()
+    app.logger.info('Seeding {} posts, {} users and {} topics'.format(posts, users, topics))
+
+    # hashing is slow on purpose, every seeded user shares the same one
+    password = generate_password_hash(SEED_PASSWORD)
+    first_user = get_next_id(db, 'user')
+    db.executemany(
+        'INSERT INTO user (id, username, password) VALUES (?, ?, ?)',
+        [(first_user + i, 'bench{}'.format(first_user + i), password) for i in range(users)]
+    )
+    user_ids = list(range(first_user, first_user + users))
+    first_topic = get_next_id(db, 'topics')
+    db.executemany(
+        'INSERT INTO topics (id, name, author_id) VALUES (?, ?, ?)',
+        [(first_topic + i, make_text(rng, 2).title(), rng.choice(user_ids)) for i in range(topics)]
+    )
+    topic_ids = list(range(first_topic, first_topic + topics))
+
+    # a pool of bodies, each rendered once
+    bodies = []
+    for i in range(64):
+        body = make_body(rng)
+        bodies.append((body,) + render_body(body))
+
+    start = datetime.datetime(2018, 1, 1)
+    step = datetime.timedelta(days=3 * 365) / posts
+    post_id = get_next_id(db, 'post')
+    comment_id = get_next_id(db, 'comments')
+    for batch_start in range(0, posts, batch_size):
+        post_rows, vote_rows, comment_rows = [], [], []
+        for i in range(batch_start, min(batch_start + batch_size, posts)):
+            created = start + step * i
+            # a few tags are much more common than the others
+            tags = {TAGS[min(int(rng.expovariate(0.3)), len(TAGS) - 1)] for j in range(rng.randint(1, 4))}
+            (body, body_html, body_html_version) = rng.choice(bodies)
+            post_rows.append((
+                post_id, make_text(rng, rng.randint(3, 9)).capitalize(), body,
+                rng.choice(user_ids), ''.join('#' + tag for tag in sorted(tags)),
+                rng.choice(topic_ids), format_time(created), body_html, body_html_version
+            ))
+            voters = rng.sample(user_ids, min(int(rng.expovariate(1 / votes_per_post)), len(user_ids)))
+            for voter in voters:
+                vote_rows.append((post_id, voter, 1 if rng.random() < 0.7 else -1))
+            thread = []
+            for j in range(int(rng.expovariate(1 / comments_per_post))):
+                replied_to = rng.choice(thread) if thread and rng.random() < 0.35 else 0
+                comment_rows.append((
+                    comment_id, replied_to, rng.choice(user_ids), post_id,
+                    format_time(created + datetime.timedelta(minutes=j + 1)),
+                    make_text(rng, rng.randint(5, 30))
+                ))
+                thread.append(comment_id)
+                comment_id += 1
+            post_id += 1
+        db.executemany(
+            'INSERT INTO post (id, title, body, author_id, tags, topic_id, created,'
+            ' body_html, body_html_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            post_rows
+        )
+        db.executemany('INSERT INTO votes (post_id, author_id, value) VALUES (?, ?, ?)', vote_rows)
+        db.executemany(
+            'INSERT INTO comments (id, repplied_to, author_id, post_id, created, body)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            comment_rows
+        )
+        db.commit()
+        app.logger.info('Seeded {} of {} posts'.format(min(batch_start + batch_size, posts), posts))
+    db.execute('ANALYZE')
+    db.commit()
+    return {'users': users, 'topics': topics, 'posts': posts}
+
+@click.command('seed-db')
+@click.option('--posts', type=int, default=10000, help='Amount of posts, like 10000, 100000 or 1000000.')
+@click.option('--users', type=int, default=None, help='Amount of users, a user every 50 posts by default.')
+@click.option('--topics', type=int, default=20, help='Amount of topics.')
+@click.option('--seed', type=int, default=0, help='Seed of the random generator.')
+@with_appcontext
+def seed_db_command(posts, users, topics, seed):
+    """Add a synthetic corpus of users, topics, posts, votes and comments."""
+    amounts = seed_database(posts, users, topics, seed=seed)
+    click.echo('Seeded {posts} posts, {users} users and {topics} topics.'.format(**amounts))
+    click.echo('The password of the seeded users is "{}".'.format(SEED_PASSWORD))
+
+def init_app(app):
+    app.cli.add_command(seed_db_command)
@@ -0,0 +1,111 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db
+
+from . __init__ import APP_CONFIG
+
+# same split of post.tags that the post_tags triggers of schema.sql do
+SPLIT_TAGS_QUERY = """
+    INSERT OR IGNORE INTO post_tags (tag, post_id)
+    WITH RECURSIVE split(post_id, tag, rest) AS (
+        SELECT id, '', substr(replace(tags, ' ', ''), instr(replace(tags, ' ', ''), '#') + 1) || '#'
+        FROM post WHERE instr(tags, '#')
+        UNION ALL
+        SELECT post_id, substr(rest, 1, instr(rest, '#') - 1), substr(rest, instr(rest, '#') + 1)
+        FROM split WHERE rest != ''
+    )
+    SELECT tag, post_id FROM split WHERE tag != ''"""
+
+# cached (version, catalog) of each database, shared by the requests of this worker
+_tag_catalog = {}
+
+#####[ Tags functions and APIs ]###############################################
+
+def parse_tags(text):
+    # '#a #b#a' -> ['a', 'b'], the text before the first '#' is not a tag
+    tags = []
+    for tag in (text or '').replace(' ', '').split('#')[1:]:
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+def get_tags_filter(tags, match_all=False):
+    # subquery of the ids of posts with any (or all) of the tags
+    query = 'SELECT post_id FROM post_tags WHERE tag IN ({})'.format(
+        ', '.join('?' * len(tags)))
+    params = list(tags)
+    if match_all:
+        query += ' GROUP BY post_id HAVING COUNT(1) = ?'
+        params.append(len(tags))
+    return query, params
+
+def get_posts_by_tags(tags, match_all=False, offset=0, limit=APP_CONFIG["POSTS_PER_PAGE"]):
+    app.logger.debug('Getting posts with {} of tags {} offset {} limit {}'.format(
+        'all' if match_all else 'any', tags, offset, limit))
+    if not tags:
+        return []
+    (tags_query, params) = get_tags_filter(tags, match_all)
+    posts = get_db().execute("""
+        SELECT p.id, title, tags, created, author_id, username, p.image, p.icon,
+            p.likes_count AS likes,
+            p.dislikes_count AS dislikes
+        FROM post p
+        JOIN user u ON p.author_id = u.id
+        WHERE p.id IN ({})
+        ORDER BY created DESC, p.id DESC
+        LIMIT ? OFFSET ?""".format(tags_query),
+        params + [limit, offset]
+    ).fetchall()
+    return posts
+
+def get_amount_of_posts_by_tags(tags, match_all=False):
+    if not tags:
+        return 0
+    (tags_query, params) = get_tags_filter(tags, match_all)
+    return get_db().execute(
+        'SELECT COUNT(1) FROM ({})'.format(tags_query), params
+    ).fetchone()[0]
+
+def get_tag_catalog():
+    # [('#tag', amount of posts), ...] sorted by tag. The catalog is only
+    # read again from the database when its version changed
+    db = get_db()
+    version = db.execute('SELECT version FROM tag_catalog_version').fetchone()[0]
+    (cached_version, catalog) = _tag_catalog.get(app.config['DATABASE'], (None, None))
+    if cached_version != version:
+        app.logger.debug('Loading the tag catalog version {}'.format(version))
+        catalog = [('#' + row['tag'], row['posts']) for row in db.execute(
+            'SELECT tag, posts FROM tag_catalog ORDER BY tag'
+        ).fetchall()]
+        _tag_catalog[app.config['DATABASE']] = (version, catalog)
+    return catalog
+
+def rebuild_tag_catalog():
+    db = get_db()
+    db.execute('DELETE FROM tag_catalog')
+    db.execute(
+        'INSERT INTO tag_catalog (tag, posts)'
+        ' SELECT tag, COUNT(1) FROM post_tags GROUP BY tag'
+    )
+    db.execute('UPDATE tag_catalog_version SET version = version + 1')
+
+def backfill_post_tags():
+    app.logger.info('Backfilling post_tags from the tags of posts')
+    db = get_db()
+    db.execute('DELETE FROM post_tags')
+    db.execute(SPLIT_TAGS_QUERY)
+    rebuild_tag_catalog()
+    db.commit()
+    return db.execute('SELECT COUNT(1) FROM post_tags').fetchone()[0]
+
+@click.command('backfill-tags')
+@with_appcontext
+def backfill_tags_command():
+    """Fill post_tags and the tag catalog from the tags column of existing posts."""
+    amount = backfill_post_tags()
+    click.echo('Indexed {} post tags.'.format(amount))
+
+def init_app(app):
+    app.cli.add_command(backfill_tags_command)
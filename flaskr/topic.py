@@ -9,6 +9,7 @@ from werkzeug.exceptions import abort
 
 from flaskr.auth import login_required
 from flaskr.db import get_db
+from flaskr.writer import execute_write
 
 import os
 import time
@@ -34,13 +35,11 @@ def create():
             flash(error)
             return redirect(request.url)
         else:
-            db = get_db()
-            db.execute(
+            execute_write(
                 'INSERT INTO topics (author_id, name)'
                 ' VALUES (?, ?)',
                 (g.user['id'], name)
             )
-            db.commit()
             return redirect(url_for('blog.index'))
     else:
         db = get_db()
@@ -64,12 +63,10 @@ def update(id):
             flash(error)
             return redirect(request.url)
         else:
-            db = get_db()
-            db.execute(
+            execute_write(
                 'UPDATE topics SET name = ? WHERE id = ?',
                 (name, id)
             )
-            db.commit()
             return redirect(url_for('blog.index'))
     else:
         return render_template('topic/update.html', topic=topic)
@@ -79,9 +76,7 @@ def update(id):
 def delete(id):
     app.logger.info('Deleting the topic id {}'.format(id))
     get_topic(id)
-    db = get_db()
-    db.execute('DELETE FROM topics WHERE id = ?', (id,))
-    db.commit()
+    execute_write('DELETE FROM topics WHERE id = ?', (id,))
     return redirect(url_for('blog.index'))
 
 #####[ Topics functions and APIs ]##############################################
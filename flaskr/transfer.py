@@ -0,0 +1,254 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+import base64
+import csv
+import itertools
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flaskr.db import get_db, get_schema_statements
+from flaskr.images import get_thumbnail_name
+from flaskr.migrations import GENERATION_TRIGGERS, restore_deferred_schema
+
+from . __init__ import APP_CONFIG
+
+# table -> exported columns, in the order they are loaded (a row comes
+# after the ones it references). Counters, tags, the search index and the
+# html of bodies are rebuilt from these after an import
+TABLES = (
+    ('user', ('id', 'username', 'password')),
+    ('topics', ('id', 'author_id', 'created', 'name')),
+    ('post', ('id', 'author_id', 'created', 'title', 'body', 'tags', 'icon', 'topic_id', 'image')),
+    ('comments', ('id', 'repplied_to', 'author_id', 'post_id', 'created', 'body')),
+    ('votes', ('post_id', 'author_id', 'value')),
+)
+
+COLUMNS = dict(TABLES)
+
+# an empty CSV field is NULL only in these columns, elsewhere it's ''
+NULLABLE_COLUMNS = ('icon', 'repplied_to')
+
+# columns that can hold bytes (the icons of legacy posts), exported as
+# BLOB_PREFIX and their base64 so JSON and CSV keep them
+BLOB_COLUMNS = ('icon',)
+BLOB_PREFIX = 'base64:'
+
+# triggers an import leaves in place: the site keeps serving, its cached
+# pages and the versions of posts must change with the imported rows
+KEPT_TRIGGERS = GENERATION_TRIGGERS + (
+    'post_body_html_stale', 'comments_version_insert', 'comments_version_update', 'comments_version_delete')
+
+#####[ Transfer functions and APIs ]###########################################
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_table(db, table):
+    # a cursor is read row by row, the table is never loaded at once
+    columns = COLUMNS[table]
+    for row in db.execute('SELECT {} FROM {}'.format(', '.join(columns), table)):
+        row = dict(zip(columns, row))
+        for column in BLOB_COLUMNS:
+            if isinstance(row.get(column), bytes):
+                row[column] = BLOB_PREFIX + base64.b64encode(row[column]).decode('ascii')
+        yield row
+
+def decode_blobs(row):
+    for column in BLOB_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str) and value.startswith(BLOB_PREFIX):
+            row[column] = base64.b64decode(value[len(BLOB_PREFIX):])
+    return row
+
+def write_jsonl(db, file, tables):
+    amounts = {}
+    for table in tables:
+        amounts[table] = 0
+        for row in iter_table(db, table):
+            row['table'] = table
+            file.write(json.dumps(row, default=str) + '\n')
+            amounts[table] += 1
+    return amounts
+
+def write_csv(db, folder, tables):
+    os.makedirs(folder, exist_ok=True)
+    amounts = {}
+    for table in tables:
+        amounts[table] = 0
+        with open(os.path.join(folder, table + '.csv'), 'w', newline='', encoding='utf8') as f:
+            writer = csv.DictWriter(f, COLUMNS[table])
+            writer.writeheader()
+            for row in iter_table(db, table):
+                writer.writerow(row)
+                amounts[table] += 1
+    return amounts
+
+def export_data(path, file_format='jsonl', tables=COLUMNS):
+    # {table: exported rows}. All the tables are read in one transaction,
+    # the export is a consistent snapshot even while the site writes
+    db = get_db()
+    db.execute('BEGIN')
+    try:
+        if file_format == 'csv':
+            return write_csv(db, path, tables)
+        with click.open_file(path, 'w', encoding='utf8') as f:
+            return write_jsonl(db, f, tables)
+    finally:
+        db.rollback()
+
+def read_jsonl(path):
+    with click.open_file(path, 'r', encoding='utf8') as f:
+        for line in f:
+            if line.strip():
+                row = decode_blobs(json.loads(line))
+                yield (row.pop('table'), row)
+
+def read_csv(folder):
+    for (table, columns) in TABLES:
+        path = os.path.join(folder, table + '.csv')
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf8') as f:
+            for row in csv.DictReader(f):
+                for column in NULLABLE_COLUMNS:
+                    if row.get(column) == '':
+                        row[column] = None
+                yield (table, decode_blobs(row))
+
+def defer_indexes_and_triggers(db):
+    # drop the indexes and triggers, loading is much faster without them.
+    # Their SQL is saved in deferred_schema in the same transaction, so
+    # they are not lost if the import stops (the indexes of constraints,
+    # like the unique usernames, stay)
+    for statement in get_schema_statements('deferred_schema'):
+        db.execute(statement)
+    deferred = [row for row in db.execute(
+        "SELECT name, type, sql FROM sqlite_master"
+        " WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+    ).fetchall() if row[0] not in KEPT_TRIGGERS]
+    db.executemany('INSERT OR REPLACE INTO deferred_schema (name, type, sql) VALUES (?, ?, ?)',
+                   [tuple(row) for row in deferred])
+    for (name, kind, sql) in deferred:
+        db.execute('DROP {} IF EXISTS {}'.format(kind.upper(), name))
+    db.commit()
+
+def import_rows(rows, batch_size=5000, transaction_size=200000):
+    # load (table, row) pairs with executemany, committing every
+    # 'transaction_size' rows. Rows of existing ids are skipped, like the
+    # invalid ones. Returns {table: (read, inserted)}
+    db = get_db()
+    amounts = {}
+    defer_indexes_and_triggers(db)
+    try:
+        pending = 0
+        for (table, group) in itertools.groupby(rows, key=lambda pair: pair[0]):
+            if table not in COLUMNS:
+                raise ValueError('Unknown table {!r}'.format(table))
+            columns = COLUMNS[table]
+            query = 'INSERT OR IGNORE INTO {} ({}) VALUES ({})'.format(
+                table, ', '.join(columns), ', '.join('?' * len(columns)))
+            (read, inserted) = amounts.get(table, (0, 0))
+            for batch in chunks(group, batch_size):
+                cursor = db.executemany(query, [tuple(row.get(column) for column in columns)
+                                                for (name, row) in batch])
+                read += len(batch)
+                inserted += cursor.rowcount
+                pending += len(batch)
+                if pending >= transaction_size:
+                    db.commit()
+                    app.logger.info('Imported {} rows of {}'.format(read, table))
+                    pending = 0
+            amounts[table] = (read, inserted)
+        db.commit()
+    finally:
+        # also after a failure, the rows committed so far stay consistent
+        db.rollback()
+        restore_deferred_schema(db)
+    return amounts
+
+def copy_file(source, target):
+    # names of images don't change their content, a present file is the same
+    if os.path.exists(target) or not os.path.isfile(source):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # two posts can share an image, each thread writes aside
+    temp_path = '{}.{}.tmp'.format(target, threading.get_ident())
+    shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+    return True
+
+def copy_images(names, source, target, workers=8, chunk_size=1000):
+    # copy the files 'names' (relative paths) of the folder 'source', in
+    # parallel threads. Returns the amount of copied files
+    copied = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunks(names, chunk_size):
+            copied += sum(executor.map(
+                lambda name: copy_file(os.path.join(source, name), os.path.join(target, name)), chunk))
+    return copied
+
+def iter_post_images(db):
+    for row in db.execute('SELECT DISTINCT image, icon FROM post'):
+        yield row['image']
+        if get_thumbnail_name(row):
+            yield os.path.join(APP_CONFIG["IMAGE_DERIVATIVES_FOLDER"], row['icon'])
+
+def iter_folder(folder):
+    for (root, dirs, files) in os.walk(folder):
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), folder)
+
+@click.command('export')
+@click.argument('path')
+@click.option('--format', 'file_format', type=click.Choice(['jsonl', 'csv']), default='jsonl',
+              help='JSON lines in one file (- is stdout), or a folder with a CSV file per table.')
+@click.option('--images', type=click.Path(file_okay=False), default=None,
+              help='Also copy the images of the posts into this folder.')
+@click.option('--workers', type=int, default=8, help='Threads copying the images.')
+@with_appcontext
+def export_command(path, file_format, images, workers):
+    """Export the users, topics, posts, comments and votes."""
+    amounts = export_data(path, file_format)
+    if images:
+        copied = copy_images(iter_post_images(get_db()), APP_CONFIG["POST_IMAGES_FOLDER"], images, workers)
+        click.echo('Copied {} images.'.format(copied), err=path == '-')
+    for (table, amount) in amounts.items():
+        click.echo('Exported {} rows of {}.'.format(amount, table), err=path == '-')
+
+@click.command('import')
+@click.argument('path')
+@click.option('--images', type=click.Path(exists=True, file_okay=False), default=None,
+              help='Also copy the images of this folder into the images folder.')
+@click.option('--workers', type=int, default=8, help='Threads copying the images.')
+@click.option('--batch-size', type=int, default=5000, help='Rows of each executemany.')
+@with_appcontext
+def import_command(path, images, workers, batch_size):
+    """Import the rows of an export, a JSON lines file (- is stdin) or a folder of CSV files.
+
+    The site can keep serving, slower without its indexes until the end.
+    If the import stops halfway, db-upgrade or another import restores them.
+    """
+    rows = read_csv(path) if os.path.isdir(path) else read_jsonl(path)
+    try:
+        amounts = import_rows(rows, batch_size)
+    except (ValueError, KeyError) as e:
+        raise click.ClickException('Invalid import data: {}'.format(e))
+    for (table, (read, inserted)) in amounts.items():
+        click.echo('Imported {} of {} rows of {}.'.format(inserted, read, table))
+    if images:
+        copied = copy_images(iter_folder(images), images, APP_CONFIG["POST_IMAGES_FOLDER"], workers)
+        click.echo('Copied {} images.'.format(copied))
+
+def init_app(app):
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_command)
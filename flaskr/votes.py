@@ -0,0 +1,76 @@
+import click
+from flask import current_app as app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db, get_schema_statements
+from flaskr.counters import rebuild_counters
+
+LIKE = 1
+DISLIKE = -1
+
+# objects of schema.sql created in databases made before votes
+VOTES_SCHEMA = ('votes', 'votes_count_insert', 'votes_count_update', 'votes_count_delete')
+
+#####[ Votes functions and APIs ]##############################################
+
+def toggle_vote(db, post_id, author_id, value):
+    # writer job, one statement per click. The same vote again takes it
+    # back (0) and the opposite one replaces it, the primary key makes two
+    # fast clicks update the same row instead of adding another one
+    app.logger.debug('Vote {} of user id {} on post id {}'.format(value, author_id, post_id))
+    db.execute(
+        'INSERT INTO votes (post_id, author_id, value) VALUES (?, ?, ?)'
+        ' ON CONFLICT (post_id, author_id) DO UPDATE SET'
+        ' value = CASE WHEN value = excluded.value THEN 0 ELSE excluded.value END',
+        (post_id, author_id, value)
+    )
+
+def get_user_vote(post_id, author_id):
+    row = get_db().execute(
+        'SELECT value FROM votes WHERE post_id = ? AND author_id = ?',
+        (post_id, author_id)
+    ).fetchone()
+    return row['value'] if row is not None else 0
+
+def has_table(db, name):
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+def migrate_votes():
+    # merge the old likes and dislikes tables into votes. Repeated rows
+    # count once, and a user with both a like and a dislike on a post ends
+    # with no vote since the two can't be told apart in time
+    db = get_db()
+    if not (has_table(db, 'likes') and has_table(db, 'dislikes')):
+        app.logger.info('No likes and dislikes tables to migrate')
+        return 0
+    app.logger.info('Merging the likes and dislikes tables into votes')
+    for statement in get_schema_statements(*VOTES_SCHEMA):
+        db.execute(statement)
+    db.execute("""
+        INSERT OR IGNORE INTO votes (post_id, author_id, value)
+        SELECT post_id, author_id, SUM(value)
+        FROM (
+            SELECT DISTINCT post_id, author_id, 1 AS value FROM likes
+            UNION ALL
+            SELECT DISTINCT post_id, author_id, -1 AS value FROM dislikes
+        )
+        GROUP BY post_id, author_id""")
+    amount = db.execute('SELECT COUNT(1) FROM votes').fetchone()[0]
+    db.execute('DROP TABLE likes')
+    db.execute('DROP TABLE dislikes')
+    db.commit()
+    # the old counters could already be off by the duplicated rows
+    rebuild_counters()
+    return amount
+
+@click.command('migrate-votes')
+@with_appcontext
+def migrate_votes_command():
+    """Merge the likes and dislikes tables into the votes table."""
+    amount = migrate_votes()
+    click.echo('Migrated {} votes.'.format(amount))
+
+def init_app(app):
+    app.cli.add_command(migrate_votes_command)
@@ -0,0 +1,153 @@
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from flaskr.db import ConnectionPool
+
+class WriteQueueFull(ServiceUnavailable):
+    description = 'Too many pending writes, try again in a moment.'
+
+class Writer(object):
+    """Runs every write of the app on one connection and thread.
+
+    Jobs are callables that receive the writer connection and must not
+    commit. The jobs queued while a batch runs are committed together,
+    each one inside its own savepoint so a failing job doesn't undo the
+    others.
+    """
+
+    def __init__(self, database, pragmas=None, flush_latency=0.001,
+                 batch_size=100, queue_size=1000, queue_timeout=1.0, app=None):
+        self.app = app
+        self.flush_latency = flush_latency
+        self.batch_size = batch_size
+        self.queue_timeout = queue_timeout
+        self._pool = ConnectionPool(database, pragmas)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'jobs': 0, 'failed': 0, 'max_batch': 0}
+        self._thread = threading.Thread(target=self._run, name='flaskr-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, job, *args):
+        future = Future()
+        try:
+            # back-pressure, the request waits a bit and then gives up
+            self._queue.put((future, job, args), timeout=self.queue_timeout)
+        except queue.Full:
+            raise WriteQueueFull()
+        return future
+
+    def write(self, job, *args):
+        return self.submit(job, *args).result()
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._pool.close()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        if self.app is None:
+            return self._loop()
+        # the jobs can log and read the config like any other app code
+        with self.app.app_context():
+            return self._loop()
+
+    def _loop(self):
+        db = self._pool.acquire()
+        # transactions are opened and closed by hand
+        db.isolation_level = None
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_latency
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._flush(db, batch)
+
+    def _flush(self, db, batch):
+        results = []
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            for (future, job, args) in batch:
+                db.execute('SAVEPOINT job')
+                try:
+                    results.append((future, job(db, *args), None))
+                    db.execute('RELEASE job')
+                except Exception as e:
+                    db.execute('ROLLBACK TO job')
+                    db.execute('RELEASE job')
+                    results.append((future, None, e))
+            db.execute('COMMIT')
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            if self.app is not None:
+                self.app.logger.error('Write batch of {} jobs failed: {}'.format(len(batch), e))
+            results = [(future, None, e) for (future, job, args) in batch]
+        failed = 0
+        for (future, result, error) in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                failed += 1
+                future.set_exception(error)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['jobs'] += len(batch)
+            self._stats['failed'] += failed
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+
+#####[ Writer functions and APIs ]#############################################
+
+def get_writer(app=None):
+    app = app or current_app._get_current_object()
+    writer = app.extensions.get('flaskr_writer')
+    if writer is None:
+        with _writer_lock:
+            writer = app.extensions.get('flaskr_writer')
+            if writer is None:
+                writer = app.extensions['flaskr_writer'] = Writer(
+                    app.config['DATABASE'],
+                    app.config.get('SQLITE_PRAGMAS'),
+                    flush_latency=app.config.get('WRITE_FLUSH_LATENCY', 0.001),
+                    batch_size=app.config.get('WRITE_BATCH_SIZE', 100),
+                    queue_size=app.config.get('WRITE_QUEUE_SIZE', 1000),
+                    queue_timeout=app.config.get('WRITE_QUEUE_TIMEOUT', 1.0),
+                    app=app
+                )
+    return writer
+
+_writer_lock = threading.Lock()
+
+def write(job, *args):
+    # run job(db, *args) on the writer connection and return its result
+    return get_writer().write(job, *args)
+
+def _execute(db, sql, params):
+    return db.execute(sql, params).lastrowid
+
+def execute_write(sql, params=()):
+    # single statement write, returns the lastrowid
+    return write(_execute, sql, params)
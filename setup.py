@@ -9,4 +9,9 @@ setup(
     install_requires=[
         'flask',
     ],
+    extras_require={
+        'images': ['Pillow'],
+        'api': ['orjson'],
+        'bench': ['pytest-benchmark'],
+    },
 )
\ No newline at end of file
@@ -3,7 +3,7 @@ import tempfile
 
 import pytest
 from flaskr import create_app
-from flaskr.db import get_db, init_db
+from flaskr.db import get_db, close_all, init_db
 
 with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
     _data_sql = f.read().decode('utf8')
@@ -24,6 +24,7 @@ def app():
 
     yield app
 
+    close_all(app)
     os.close(db_fd)
     os.unlink(db_path)
 
@@ -0,0 +1,60 @@
+from flaskr.db import get_db
+
+
+def add_posts(app, amount):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, tags, topic_id, author_id, created)'
+            ' VALUES (?, ?, ?, 1, 1, ?)',
+            [('post {}'.format(i), 'body', '#api', '2019-01-01 00:00:{:02d}'.format(i))
+             for i in range(amount)]
+        )
+        db.commit()
+
+
+def test_posts_cursor(client, app):
+    add_posts(app, 3)
+    data = client.get('/api/v1/posts?limit=2&fields=id,title').get_json()
+    assert data['posts'] == [{'id': 4, 'title': 'post 2'}, {'id': 3, 'title': 'post 1'}]
+    assert data['prev_cursor'] is None
+
+    data = client.get('/api/v1/posts?limit=2&cursor=' + data['next_cursor']).get_json()
+    assert [post['title'] for post in data['posts']] == ['post 0', 'test title']
+    assert data['next_cursor'] is None
+    assert data['posts'][1]['created'] == '2018-01-01T00:00:00'
+
+
+def test_posts_by_tags(client, app):
+    add_posts(app, 2)
+    data = client.get('/api/v1/posts?tags=%23api&limit=1').get_json()
+    assert [post['title'] for post in data['posts']] == ['post 1']
+    assert data['next_page'] == 2
+
+
+def test_post_detail(client):
+    data = client.get('/api/v1/posts/1').get_json()
+    assert data['post']['body_html'] == '<p>test\nbody</p>'
+    assert data['post']['username'] == 'test'
+    response = client.get('/api/v1/posts/2')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
+
+
+def test_comments_and_topics(client, app):
+    with app.app_context():
+        get_db().execute("INSERT INTO comments (author_id, post_id, body) VALUES (1, 1, 'hi')")
+        get_db().commit()
+    data = client.get('/api/v1/posts/1/comments').get_json()
+    assert [comment['body'] for comment in data['comments']] == ['hi']
+
+    topics = client.get('/api/v1/topics').get_json()['topics']
+    assert topics[0]['name'] == 'test topic'
+    assert topics[0]['posts'][0]['title'] == 'test title'
+
+
+def test_invalid_cursor(client):
+    for url in ('/api/v1/posts?cursor=x', '/api/v1/posts/1/comments?cursor=x'):
+        response = client.get(url)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid cursor.'
@@ -1,5 +1,6 @@
 import pytest
 from flask import g, session
+from flaskr.auth import invalidate_user, load_logged_in_user
 from flaskr.db import get_db
 
 
@@ -52,4 +53,34 @@ def test_logout(client, auth):
 
     with client:
         auth.logout()
-        assert 'user_id' not in session
\ No newline at end of file
+        assert 'user_id' not in session
+
+def test_user_loaded_on_use(client, auth, app, monkeypatch):
+    auth.login()
+    loads = []
+    monkeypatch.setattr('flaskr.auth.load_logged_in_user',
+        lambda original=load_logged_in_user: loads.append(1) or original())
+
+    with client:
+        client.get('/images/missing.png')
+        assert loads == []
+        client.get('/')
+        assert loads == [1]
+        assert 'password' not in g.user
+
+
+def test_user_cache(client, auth, app):
+    auth.login()
+    client.get('/')
+
+    with app.app_context():
+        get_db().execute("UPDATE user SET username = 'renamed' WHERE id = 1")
+        get_db().commit()
+    # served from the cache until it is invalidated
+    assert b'<span>test</span>' in client.get('/').data
+
+    with app.app_context():
+        invalidate_user(1)
+    assert b'<span>renamed</span>' in client.get('/').data
+    with app.app_context():
+        invalidate_user(1)
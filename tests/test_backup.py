@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+from flaskr.__init__ import APP_CONFIG
+from flaskr.backup import BackupScheduler, backup_lock, backup_site, get_backups, verify_backup
+from flaskr.db import get_db
+
+
+@pytest.fixture
+def images_folder(tmp_path, monkeypatch):
+    folder = tmp_path / 'images'
+    (folder / 'derived').mkdir(parents=True)
+    (folder / 'a.png').write_bytes(b'image')
+    (folder / 'derived' / 'a_thumb.png').write_bytes(b'thumb')
+    monkeypatch.setitem(APP_CONFIG, 'POST_IMAGES_FOLDER', str(folder))
+    return folder
+
+
+def test_backup_site(app, images_folder, tmp_path):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET image = 'a.png', icon = 'a_thumb.png'")
+        db.commit()
+        path = backup_site(str(tmp_path / 'backups'), pages=1, pause=0)
+
+    assert verify_backup(path) == []
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert [entry['name'] for entry in manifest['images']] == ['a.png', os.path.join('derived', 'a_thumb.png')]
+    assert manifest['missing_images'] == []
+    backup = sqlite3.connect(os.path.join(path, 'flaskr.sqlite'))
+    assert backup.execute('SELECT title FROM post').fetchall() == [('test title',)]
+    assert backup.execute('PRAGMA user_version').fetchone()[0] == manifest['database']['user_version']
+    backup.close()
+
+    # a changed file is found
+    (images_folder / 'a.png').write_bytes(b'other')
+    with open(os.path.join(path, 'images', 'a.png'), 'wb') as f:
+        f.write(b'other')
+    assert verify_backup(path) == ['images/a.png changed']
+
+
+def test_snapshot_while_writing(app, images_folder, tmp_path, monkeypatch):
+    # the site commits while the copy runs, the backup is the data it started with
+    from flaskr import backup
+    copy_database = backup.copy_database
+
+    def copy_while_writing(source, target, pages, pause):
+        writer = sqlite3.connect(app.config['DATABASE'])
+        writer.execute("INSERT INTO post (title, body, tags, topic_id, author_id) VALUES ('new', '', '', 1, 1)")
+        writer.commit()
+        writer.close()
+        return copy_database(source, target, pages, pause)
+
+    monkeypatch.setattr(backup, 'copy_database', copy_while_writing)
+    with app.app_context():
+        path = backup_site(str(tmp_path / 'backups'), pages=1, pause=0, images=False)
+    backup_db = sqlite3.connect(os.path.join(path, 'flaskr.sqlite'))
+    assert backup_db.execute('SELECT COUNT(1) FROM post').fetchone()[0] == 1
+    backup_db.close()
+
+
+def test_keep_backups(app, images_folder, tmp_path):
+    folder = str(tmp_path / 'backups')
+    app.config['BACKUP_KEEP'] = 2
+    with app.app_context():
+        paths = [backup_site(folder, images=False, pause=0) for i in range(3)]
+    assert get_backups(folder) == [os.path.basename(path) for path in paths[1:]]
+
+
+def test_backup_db_command(runner, images_folder, tmp_path):
+    result = runner.invoke(args=['backup-db', '--folder', str(tmp_path / 'backups'), '--pause', '0'])
+    assert 'Backed up the site into' in result.output
+    path = result.output.strip().rsplit(' ', 1)[1].rstrip('.')
+
+    result = runner.invoke(args=['backup-db', '--verify', path])
+    assert 'The backup is sound.' in result.output
+
+
+def test_backup_scheduler(app, images_folder, tmp_path):
+    folder = str(tmp_path / 'backups')
+    app.config.update(BACKUP_DIR=folder, BACKUP_PAUSE=0)
+    scheduler = BackupScheduler(app, 0.05)
+    deadline = time.monotonic() + 5
+    while not get_backups(folder) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    scheduler.stop()
+    assert get_backups(folder)
+
+
+def test_scheduler_counts_from_newest_backup(app, images_folder, tmp_path):
+    # another worker (or an earlier run) just made one, no backup is due
+    folder = str(tmp_path / 'backups')
+    app.config.update(BACKUP_DIR=folder, BACKUP_PAUSE=0)
+    with app.app_context():
+        backup_site(images=False)
+    scheduler = BackupScheduler(app, 60)
+    time.sleep(0.2)
+    assert 59 < scheduler.get_delay() <= 60
+    scheduler.stop()
+    assert len(get_backups(folder)) == 1
+
+
+def test_backup_db_command_lock(app, runner, tmp_path):
+    folder = str(tmp_path / 'backups')
+    with backup_lock(folder) as locked:
+        assert locked
+        result = runner.invoke(args=['backup-db', '--folder', folder])
+    assert 'Another backup of the folder is running.' in result.output
+    assert get_backups(folder) == []
+
+
+def test_scheduler_started_by_requests(app, client, runner, images_folder, tmp_path):
+    app.config.update(BACKUP_DIR=str(tmp_path / 'backups'), BACKUP_INTERVAL=3600)
+    runner.invoke(args=['backup-db', '--verify', str(tmp_path)])
+    assert 'flaskr_backup_scheduler' not in app.extensions
+    client.get('/')
+    assert 'flaskr_backup_scheduler' in app.extensions
+
+
+def test_unfinished_backups_removed(app, images_folder, tmp_path):
+    # a backup stopped with its process leaves its .tmp folder
+    folder = tmp_path / 'backups'
+    (folder / '20180101-000000.tmp').mkdir(parents=True)
+    with app.app_context():
+        with backup_lock(str(folder)):
+            path = backup_site(str(folder), images=False, pause=0)
+    assert sorted(os.listdir(str(folder))) == ['.lock', os.path.basename(path)]
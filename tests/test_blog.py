@@ -1,6 +1,25 @@
+import io
+
 import pytest
+from flaskr.__init__ import APP_CONFIG
 from flaskr.db import get_db
 
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 32
+
+
+@pytest.fixture
+def images_folder(tmp_path, monkeypatch):
+    (tmp_path / 'derived').mkdir()
+    monkeypatch.setitem(APP_CONFIG, 'POST_IMAGES_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def get_form(**fields):
+    form = {'title': 'created', 'body': 'body', 'tags': '#test', 'topic': 1,
+            'file': (io.BytesIO(PNG), 'photo.png')}
+    form.update(fields)
+    return form
+
 
 def test_index(client, auth):
     response = client.get('/')
@@ -12,7 +31,6 @@ def test_index(client, auth):
     assert b'Log Out' in response.data
     assert b'test title' in response.data
     assert b'by test on 2018-01-01' in response.data
-    assert b'test\nbody' in response.data
     assert b'href="/1/update"' in response.data
 
 @pytest.mark.parametrize('path', (
@@ -48,10 +66,11 @@ def test_exists_required(client, auth, path):
     auth.login()
     assert client.post(path).status_code == 404
 
-def test_create(client, auth, app):
+def test_create(client, auth, app, images_folder):
     auth.login()
     assert client.get('/create').status_code == 200
-    client.post('/create', data={'title': 'created', 'body': ''})
+    response = client.post('/create', data=get_form())
+    assert response.headers['Location'] == 'http://localhost/index'
 
     with app.app_context():
         db = get_db()
@@ -62,7 +81,8 @@ def test_create(client, auth, app):
 def test_update(client, auth, app):
     auth.login()
     assert client.get('/1/update').status_code == 200
-    client.post('/1/update', data={'title': 'updated', 'body': ''})
+    # without a new file the image of the post is kept
+    client.post('/1/update', data=get_form(title='updated', file=(io.BytesIO(b''), '')))
 
     with app.app_context():
         db = get_db()
@@ -74,17 +94,18 @@ def test_update(client, auth, app):
     '/create',
     '/1/update',
 ))
-def test_create_update_validate(client, auth, path):
+def test_create_update_validate(client, auth, images_folder, path):
     auth.login()
-    response = client.post(path, data={'title': '', 'body': ''})
+    response = client.post(path, data=get_form(title=''), follow_redirects=True)
     assert b'Title is required.' in response.data
 
+
 def test_delete(client, auth, app):
     auth.login()
     response = client.post('/1/delete')
-    assert response.headers['Location'] == 'http://localhost/'
+    assert response.headers['Location'] == 'http://localhost/index'
 
     with app.app_context():
         db = get_db()
         post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
-        assert post is None
\ No newline at end of file
+        assert post is None
@@ -0,0 +1,130 @@
+from flaskr.comments import get_comment_tree, get_comment_page, delete_comment_thread
+from flaskr.db import get_db
+from flaskr.feed import decode_cursor
+from flaskr.writer import write
+
+
+def add_thread(app):
+    # 1 <- 2 <- 3, 4 is a second top level comment
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO comments (id, repplied_to, author_id, post_id, body, created)'
+            ' VALUES (?, ?, 1, 1, ?, ?)',
+            [(1, 0, 'first', '2019-01-01 00:00:01'),
+             (2, 1, 'reply', '2019-01-01 00:00:02'),
+             (3, 2, 'nested reply', '2019-01-01 00:00:03'),
+             (4, 0, 'second', '2019-01-01 00:00:04')]
+        )
+        db.commit()
+
+
+def test_comment_tree(app):
+    add_thread(app)
+    with app.app_context():
+        tree = get_comment_tree(1)
+
+    assert [comment['body'] for comment in tree] == ['second', 'first']
+    reply = tree[1]['replies'][0]
+    assert reply['body'] == 'reply'
+    assert reply['replies'][0]['body'] == 'nested reply'
+    assert reply['replies'][0]['depth'] == 2
+
+
+def test_delete_comment_thread(app):
+    add_thread(app)
+    with app.app_context():
+        write(delete_comment_thread, 1)
+        assert [comment['body'] for comment in get_comment_tree(1)] == ['second']
+        assert get_db().execute('SELECT comments_count FROM post WHERE id = 1').fetchone()[0] == 1
+
+
+def test_detail_nested_replies(client, app):
+    add_thread(app)
+    response = client.get('/1/detail')
+    assert b'nested reply' in response.data
+
+
+def add_replies(app, amount, parent=1):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO comments (repplied_to, author_id, post_id, body, created)'
+            ' VALUES (?, 1, 1, ?, ?)',
+            [(parent, 'reply {}'.format(i), '2019-01-02 00:00:{:02d}'.format(i))
+             for i in range(amount)]
+        )
+        db.commit()
+
+
+def test_comment_page(app):
+    add_thread(app)
+    with app.app_context():
+        (tree, next_cursor) = get_comment_page(1, limit=1)
+        assert [comment['body'] for comment in tree] == ['second']
+        assert next_cursor is not None
+
+        (tree, next_cursor) = get_comment_page(1, cursor=decode_cursor(next_cursor), limit=1)
+        assert [comment['body'] for comment in tree] == ['first']
+        assert tree[0]['replies'][0]['replies'][0]['body'] == 'nested reply'
+        assert next_cursor is None
+
+
+def test_comment_page_bounded_replies(app):
+    add_thread(app)
+    add_replies(app, 5)
+    with app.app_context():
+        (tree, next_cursor) = get_comment_page(1, limit=2, max_rows=5)
+        first = tree[1]
+        assert first['replies_count'] == 6
+        assert len(first['replies']) == 3
+        assert first['replies_cursor'] is not None
+
+        (replies, next_cursor) = get_comment_page(
+            1, parent_id=1, cursor=decode_cursor(first['replies_cursor']), limit=2)
+        assert [reply['body'] for reply in replies] == ['reply 2', 'reply 3']
+        assert next_cursor is not None
+
+
+def test_comment_page_small_tree_limit(app):
+    # the page itself is never cut, its next cursor stays
+    add_thread(app)
+    with app.app_context():
+        (tree, next_cursor) = get_comment_page(1, limit=1, max_rows=1)
+        assert [comment['body'] for comment in tree] == ['second']
+        assert next_cursor is not None
+
+
+def test_replies_cut_in_created_order(app):
+    # imported replies whose ids don't follow their dates
+    add_thread(app)
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO comments (id, repplied_to, author_id, post_id, body, created)'
+            ' VALUES (?, 1, 1, 1, ?, ?)',
+            [(10, 'late', '2019-01-03 00:00:00'), (11, 'early', '2019-01-01 00:00:01')]
+        )
+        db.commit()
+        (tree, next_cursor) = get_comment_page(1, limit=2, max_rows=3)
+        first = tree[1]
+        assert [reply['body'] for reply in first['replies']] == ['early']
+        (replies, next_cursor) = get_comment_page(
+            1, parent_id=1, cursor=decode_cursor(first['replies_cursor']))
+        assert [reply['body'] for reply in replies] == ['reply', 'late']
+
+
+def test_comments_invalid_cursor(client):
+    assert client.get('/1/comments?cursor=x').status_code == 400
+
+
+def test_comments_fragment(client, app):
+    add_thread(app)
+    add_replies(app, 3)
+    response = client.get('/1/comments?parent=1')
+    assert b'reply 2' in response.data
+    assert b'<html' not in response.data
+
+    response = client.get('/1/comments?format=json')
+    assert [c['body'] for c in response.get_json()['comments']] == ['second', 'first']
+    assert client.get('/2/comments').status_code == 404
@@ -0,0 +1,43 @@
+from flaskr.counters import rebuild_counters, verify_counters
+from flaskr.db import get_db
+
+
+def test_counters_follow_writes(client, auth, app):
+    auth.login()
+    client.get('/1/like')
+    client.get('/1/dislike')
+    client.post('/1/comment', data={'body': 'a comment'})
+
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post WHERE id = 1').fetchone()
+        # the dislike replaced the like
+        assert (post['likes_count'], post['dislikes_count'], post['comments_count']) == (0, 1, 1)
+
+    client.get('/1/dislike')
+    with app.app_context():
+        assert get_db().execute('SELECT dislikes_count FROM post WHERE id = 1').fetchone()[0] == 0
+        assert verify_counters() == []
+
+
+def test_rebuild_counters(app):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE post SET likes_count = 5 WHERE id = 1')
+        db.commit()
+        assert verify_counters() == [(1, 'likes_count', 5, 0)]
+        rebuild_counters()
+        assert verify_counters() == []
+
+
+def test_rebuild_counters_command(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE post SET comments_count = 3 WHERE id = 1')
+        db.commit()
+
+    result = runner.invoke(args=['rebuild-counters', '--check'])
+    assert result.exit_code != 0
+    assert 'comments_count is 3, expected 0' in result.output
+
+    result = runner.invoke(args=['rebuild-counters'])
+    assert 'All post counters are exact.' in result.output
@@ -1,19 +1,93 @@
 import sqlite3
+import threading
 
 import pytest
-from flaskr.db import get_db
+from flaskr.db import ConnectionPool, get_db, get_pool, get_pool_stats
 
 
 def test_get_close_db(app):
     with app.app_context():
         db = get_db()
         assert db is get_db()
+        db.execute("UPDATE post SET title = 'not committed'")
 
+    # the connection goes back to the pool, without the pending writes
+    with app.app_context():
+        assert get_db() is db
+        assert db.execute('SELECT title FROM post').fetchone()[0] == 'test title'
+
+    get_pool(app).close()
     with pytest.raises(sqlite3.ProgrammingError) as e:
         db.execute('SELECT 1')
 
     assert 'closed' in str(e.value)
 
+
+def test_pool_tuning(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        stats = get_pool_stats()['read_write']
+    assert stats['open'] == 1
+    assert stats['reused'] >= 1
+
+
+def test_pool_per_thread(app):
+    connections = []
+
+    def worker():
+        with app.app_context():
+            connections.append(get_db())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    with app.app_context():
+        assert get_db() is not connections[0]
+    # the connection of the thread was closed when it ended
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute('SELECT 1')
+    assert get_pool(app).get_stats()['open'] == 1
+
+
+def test_pool_short_lived_threads(app, client):
+    # like a server starting a thread per request
+    def request():
+        assert client.get('/').status_code == 200
+
+    for i in range(50):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    stats = get_pool(app, read_only=True).get_stats()
+    assert stats['created'] == 50
+    assert stats['open'] == 0
+    assert stats['closed'] == 50
+
+
+def test_pool_size(app):
+    pool = ConnectionPool(app.config['DATABASE'], size=1)
+    first = pool.acquire()
+    threads_connections = []
+
+    def worker():
+        connection = pool.acquire()
+        threads_connections.append(connection)
+        # beyond the size the connection is closed once released
+        pool.release(connection)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert threads_connections[0] is not first
+    with pytest.raises(sqlite3.ProgrammingError):
+        threads_connections[0].execute('SELECT 1')
+    stats = pool.get_stats()
+    assert (stats['open'], stats['overflow']) == (1, 1)
+    pool.close()
+
+
 def test_init_db_command(runner, monkeypatch):
     class Recorder(object):
         called = False
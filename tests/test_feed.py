@@ -0,0 +1,95 @@
+import base64
+import json
+
+from flaskr.db import get_db
+from flaskr.feed import (
+    get_topic_sections, encode_cursor, decode_cursor, get_posts_by_cursor
+)
+
+
+def add_posts(app, amount, topic_id=1):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, tags, topic_id, author_id, created)'
+            ' VALUES (?, ?, ?, ?, 1, ?)',
+            [('post {}'.format(i), 'body', '#feed', topic_id,
+              '2019-01-01 00:00:{:02d}'.format(i)) for i in range(amount)]
+        )
+        db.commit()
+
+
+def test_topic_sections(app):
+    add_posts(app, 7)
+    with app.app_context():
+        get_db().execute("INSERT INTO topics (name, author_id) VALUES ('empty', 1)")
+        get_db().commit()
+    with app.test_request_context('/'):
+        sections = get_topic_sections(per_topic=5)
+
+    assert len(sections) == 1
+    assert sections[0]['name'] == 'test topic'
+    assert sections[0]['total'] == 8
+    assert [post['title'] for post in sections[0]['posts']] == [
+        'post 6', 'post 5', 'post 4', 'post 3', 'post 2']
+
+
+def test_topic_sections_page(app):
+    add_posts(app, 7)
+    with app.test_request_context('/?topic_1_page=2'):
+        sections = get_topic_sections({1: 2}, per_topic=5)
+
+    assert sections[0]['page'] == 2
+    assert [post['title'] for post in sections[0]['posts']] == [
+        'post 1', 'post 0', 'test title']
+
+
+def test_index_topic_page(client, app):
+    add_posts(app, 7)
+    response = client.get('/?topic_1_page=2')
+    assert b'test title' in response.data
+    assert b'post 6' not in response.data
+    assert b'topic_1_page=2' in response.data
+
+
+def test_cursor_round_trip(app):
+    with app.app_context():
+        post = {'created': '2019-01-01 00:00:05', 'id': 6}
+        token = encode_cursor(post, 'next', 2)
+        assert decode_cursor(token) == {
+            'created': '2019-01-01 00:00:05', 'id': 6, 'direction': 'next', 'page': 2}
+        assert decode_cursor('not-a-cursor') is None
+        # a crafted token must not reach the SQL binding
+        crafted = base64.urlsafe_b64encode(json.dumps([['x'], 6, 'next', 2]).encode('utf8')).decode('ascii')
+        assert decode_cursor(crafted) is None
+
+
+def test_posts_by_cursor(app):
+    add_posts(app, 7)
+    with app.app_context():
+        (posts, next_cursor, prev_cursor) = get_posts_by_cursor(
+            {'created': '2019-01-01 00:00:04', 'id': 6, 'direction': 'next', 'page': 2},
+            limit=3)
+        assert [post['title'] for post in posts] == ['post 3', 'post 2', 'post 1']
+        assert decode_cursor(next_cursor)['page'] == 3
+        assert decode_cursor(prev_cursor)['page'] == 1
+
+        (posts, next_cursor, prev_cursor) = get_posts_by_cursor(
+            decode_cursor(prev_cursor), limit=3)
+        assert [post['title'] for post in posts] == ['post 6', 'post 5', 'post 4']
+        assert prev_cursor is None
+
+
+def test_index_cursor(client, app):
+    add_posts(app, 12)
+    response = client.get('/')
+    assert b'Older posts' in response.data
+
+    with app.app_context():
+        token = encode_cursor({'created': '2019-01-01 00:00:02', 'id': 4}, 'next', 2)
+    response = client.get('/?cursor=' + token)
+    assert b'post 1' in response.data
+    assert b'post 0' in response.data
+    assert b'test title' in response.data
+    assert b'post 2' not in response.data
+    assert b'Newer posts' in response.data
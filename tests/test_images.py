@@ -0,0 +1,137 @@
+import hashlib
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from flaskr.__init__ import APP_CONFIG
+from flaskr.db import get_db
+from flaskr.images import create_derivatives, process_post_image, save_image_upload
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def images_folder(tmp_path, monkeypatch):
+    (tmp_path / 'derived').mkdir()
+    monkeypatch.setitem(APP_CONFIG, 'POST_IMAGES_FOLDER', str(tmp_path))
+    monkeypatch.setitem(APP_CONFIG, 'POST_IMAGES_PREFIX', str(tmp_path))
+    Image.new('RGB', (400, 200), 'red').save(str(tmp_path / 'photo.png'))
+    return tmp_path
+
+
+def test_create_derivatives(app, images_folder):
+    with app.app_context():
+        derivatives = create_derivatives('photo.png')
+
+    assert set(derivatives) == {'thumb', 'web'}
+    assert derivatives['thumb'].endswith('_thumb.png')
+    with Image.open(str(images_folder / 'derived' / derivatives['thumb'])) as thumb:
+        assert thumb.size == (84, 42)
+    with Image.open(str(images_folder / 'derived' / derivatives['web'])) as web:
+        assert web.size == (400, 200)
+
+
+def test_process_post_image(app, client, images_folder):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET image = 'photo.png' WHERE id = 1")
+        db.commit()
+    process_post_image(app, 1, 'photo.png')
+
+    with app.app_context():
+        icon = get_db().execute('SELECT icon FROM post WHERE id = 1').fetchone()[0]
+    assert icon.endswith('_thumb.png')
+
+    response = client.get('/1/image?variant=thumb')
+    assert response.status_code == 200
+    assert len(response.data) < os.path.getsize(str(images_folder / 'photo.png'))
+    response.close()
+    assert client.get('/2/image').status_code == 404
+
+
+def test_image_file_cache_headers(client, images_folder):
+    data = (images_folder / 'photo.png').read_bytes()
+    name = hashlib.sha256(data).hexdigest() + '.png'
+    (images_folder / name).write_bytes(data)
+    response = client.get('/images/' + name)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+    response.close()
+
+    response = client.get('/images/' + name, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/images/' + name, headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert len(response.data) == 10
+    response.close()
+
+
+def test_mutable_image_file(client, images_folder):
+    # names that aren't a digest can be replaced, they are revalidated
+    response = client.get('/images/photo.png')
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert 'max-age=3600' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    response.close()
+    assert client.get('/images/photo.png', headers={'If-None-Match': etag}).status_code == 304
+
+    (images_folder / 'photo.png').write_bytes(b'other')
+    response = client.get('/images/photo.png', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.data == b'other'
+
+
+def test_image_file_accel_redirect(client, images_folder, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'IMAGE_ACCEL_REDIRECT', '/internal/images/')
+    response = client.get('/images/photo.png')
+    assert response.headers['X-Accel-Redirect'] == '/internal/images/photo.png'
+    assert response.data == b''
+    assert client.get('/images/missing.png').status_code == 404
+
+
+def test_index_image_urls(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET image = 'photo.png', icon = 'abc_thumb.png' WHERE id = 1")
+        db.commit()
+    assert b'src="/images/derived/abc_thumb.png"' in client.get('/').data
+
+
+def test_legacy_blob_icon(client, app, images_folder):
+    # the first schema stored the image bytes in icon, there is no thumbnail
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET image = 'photo.png', icon = ? WHERE id = 1",
+                   ((images_folder / 'photo.png').read_bytes(),))
+        db.commit()
+    assert b'src="/images/photo.png"' in client.get('/').data
+    assert client.get('/1/image?variant=thumb').status_code == 200
+
+
+def upload(data, name='photo.png'):
+    return FileStorage(stream=io.BytesIO(data), filename=name)
+
+
+def test_save_image_upload(app, images_folder, monkeypatch):
+    data = (images_folder / 'photo.png').read_bytes()
+    with app.app_context():
+        (filename, error) = save_image_upload(upload(data, 'other name.gif'))
+        assert error is None
+        assert filename == hashlib.sha256(data).hexdigest() + '.png'
+
+        # the same content is stored once
+        assert save_image_upload(upload(data)) == (filename, None)
+        assert sorted(os.listdir(str(images_folder))) == sorted(['derived', filename, 'photo.png'])
+
+        (filename, error) = save_image_upload(upload(b'not an image', 'fake.png'))
+        assert filename is None
+        assert 'not a PNG' in error
+
+        monkeypatch.setitem(APP_CONFIG, 'MAX_IMAGE_SIZE', 10)
+        (filename, error) = save_image_upload(upload(data))
+        assert 'bigger than 10 bytes' in error
+    assert len(os.listdir(str(images_folder))) == 3
@@ -0,0 +1,97 @@
+import gc
+import json
+import os
+import threading
+
+from flaskr import metrics
+from flaskr.metrics import decode_snapshot, encode_snapshot, get_snapshot, increment
+
+
+def get_metric_lines(client, name):
+    text = client.get('/metrics').data.decode('utf8')
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_metrics(client):
+    client.get('/1/detail')
+    client.get('/missing-page')
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode('utf8')
+    assert '# TYPE flaskr_request_duration_seconds histogram' in text
+    assert 'flaskr_request_duration_seconds_bucket{endpoint="blog.detail",le="+Inf"}' in text
+    assert 'flaskr_requests_total{endpoint="none",status="404"}' in text
+    assert 'flaskr_db_rows_total{endpoint="blog.detail"}' in text
+    assert 'flaskr_template_render_seconds_count{template="blog/detail.html"}' in text
+
+
+def test_metrics_count_requests(client):
+    def detail_count():
+        lines = get_metric_lines(client, 'flaskr_request_duration_seconds_count{endpoint="blog.detail"}')
+        return int(lines[0].split()[-1]) if lines else 0
+
+    before = detail_count()
+    client.get('/1/detail')
+    client.get('/1/detail')
+    assert detail_count() == before + 2
+
+
+def test_metrics_shared_by_workers(client, app, tmp_path):
+    app.config['METRICS_DIR'] = str(tmp_path)
+    # another worker left its snapshot in the folder
+    snapshot = get_snapshot()
+    snapshot['counters'] = {('flaskr_upload_bytes_total', ()): 1000}
+    snapshot['histograms'] = {}
+    (tmp_path / '1.json').write_text(json.dumps(encode_snapshot(snapshot)))
+
+    lines = get_metric_lines(client, 'flaskr_upload_bytes_total')
+    assert lines and int(lines[0].split()[-1]) >= 1000
+    assert decode_snapshot(encode_snapshot(snapshot)) == snapshot
+
+
+def get_uploaded(snapshot):
+    return snapshot['counters'].get(('flaskr_upload_bytes_total', ()), 0)
+
+
+def test_buffers_of_ended_threads(app):
+    # short-lived threads don't leave a buffer each, their counts stay
+    with app.app_context():
+        before = get_uploaded(get_snapshot())
+        buffers = len(metrics._buffers)
+        threads = [threading.Thread(target=increment, args=('flaskr_upload_bytes_total', (), 1))
+                   for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gc.collect()
+        assert len(metrics._buffers) <= buffers
+        assert get_uploaded(get_snapshot()) == before + 50
+
+
+def test_stopped_worker_files(client, app, tmp_path):
+    app.config['METRICS_DIR'] = str(tmp_path)
+    snapshot = {'counters': {('flaskr_upload_bytes_total', ()): 1000}, 'histograms': {}}
+    # above the largest pid, no process runs with it
+    (tmp_path / '{}-1.json'.format(2 ** 22 + 1)).write_text(json.dumps(encode_snapshot(snapshot)))
+
+    with app.app_context():
+        uploaded = get_uploaded(get_snapshot())
+    lines = get_metric_lines(client, 'flaskr_upload_bytes_total')
+    assert int(lines[0].split()[-1]) == uploaded + 1000
+    # merged into the retired file, once
+    names = sorted(os.listdir(str(tmp_path)))
+    assert 'retired.json' in names and '{}-1.json'.format(2 ** 22 + 1) not in names
+    assert any(name.startswith('{}-'.format(os.getpid())) for name in names)
+    lines = get_metric_lines(client, 'flaskr_upload_bytes_total')
+    assert int(lines[0].split()[-1]) == uploaded + 1000
+
+
+def test_metrics_flusher(client, app, tmp_path):
+    app.config.update(METRICS_DIR=str(tmp_path), METRICS_FLUSH_INTERVAL=60)
+    client.get('/1/detail')
+    flusher = app.extensions['flaskr_metrics_flusher']
+    flusher.stop()
+    del app.extensions['flaskr_metrics_flusher']
+    # the last snapshot is written when it stops
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.json')]
@@ -0,0 +1,171 @@
+import os
+
+import pytest
+from flaskr.__init__ import APP_CONFIG
+from flaskr.counters import verify_counters
+from flaskr.db import get_db
+from flaskr.migrations import LATEST_VERSION, MIGRATIONS, get_schema_version, upgrade_db
+from flaskr.search import search_posts
+from flaskr.votes import get_user_vote
+
+# the tables of the first version of schema.sql, before any migration
+OLD_SCHEMA = """
+DROP TABLE IF EXISTS user;
+DROP TABLE IF EXISTS post;
+DROP TABLE IF EXISTS votes;
+DROP TABLE IF EXISTS comments;
+DROP TABLE IF EXISTS topics;
+DROP TABLE IF EXISTS post_search;
+DROP TABLE IF EXISTS post_tags;
+DROP TABLE IF EXISTS tag_catalog;
+DROP TABLE IF EXISTS tag_catalog_version;
+DROP TABLE IF EXISTS data_generation;
+
+CREATE TABLE user (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT UNIQUE NOT NULL,
+  password TEXT NOT NULL
+);
+
+CREATE TABLE post (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  title TEXT NOT NULL,
+  body TEXT NOT NULL,
+  tags TEXT NOT NULL,
+  icon BLOB,
+  topic_id INTEGER NOT NULL,
+  image TEXT NOT NULL DEFAULT "default-post.png"
+);
+
+CREATE TABLE topics (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  name TEXT NOT NULL
+);
+
+CREATE TABLE likes (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  post_id INTEGER NOT NULL
+);
+
+CREATE TABLE dislikes (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  post_id INTEGER NOT NULL
+);
+
+CREATE TABLE comments (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  repplied_to INTEGER DEFAULT 0,
+  author_id INTEGER NOT NULL,
+  post_id INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  body TEXT NOT NULL
+);
+
+INSERT INTO user (username, password) VALUES ('test', 'x'), ('other', 'x');
+INSERT INTO topics (author_id, name) VALUES (1, 'topic');
+INSERT INTO post (author_id, title, body, tags, topic_id)
+VALUES (1, 'old title', 'old body', '#python #flask', 1), (2, 'second', 'body', '#python', 1);
+INSERT INTO likes (author_id, post_id) VALUES (1, 1), (1, 1), (2, 1);
+INSERT INTO dislikes (author_id, post_id) VALUES (1, 2);
+INSERT INTO comments (author_id, post_id, body) VALUES (1, 1, 'a comment'), (2, 1, 'another');
+PRAGMA user_version = 0;
+"""
+
+
+def get_names(db, kind):
+    return {row[0] for row in db.execute('SELECT name FROM sqlite_master WHERE type = ?', (kind,))}
+
+
+def test_new_database_is_current(app):
+    with app.app_context():
+        assert get_schema_version() == LATEST_VERSION
+        assert upgrade_db() == []
+
+
+def test_versions_are_ordered():
+    assert [number for (number, description, step) in MIGRATIONS] == list(range(1, LATEST_VERSION + 1))
+
+
+def test_upgrade_old_database(app):
+    with app.app_context():
+        db = get_db()
+        db.executescript(OLD_SCHEMA)
+        applied = upgrade_db()
+        assert [number for (number, description) in applied] == list(range(1, LATEST_VERSION + 1))
+        assert get_schema_version() == LATEST_VERSION
+
+        assert {'post_created', 'post_topic_created', 'comments_post', 'comments_repplied_to'} <= get_names(db, 'index')
+        assert {'likes', 'dislikes'}.isdisjoint(get_names(db, 'table'))
+        post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
+        assert (post['title'], post['likes_count'], post['dislikes_count'], post['comments_count']) == ('old title', 2, 0, 2)
+        assert get_user_vote(2, 1) == -1
+        assert verify_counters() == []
+        assert [row['id'] for row in search_posts('old')] == [1]
+        assert db.execute("SELECT posts FROM tag_catalog WHERE tag = 'python'").fetchone()[0] == 2
+        assert db.execute('SELECT COUNT(1) FROM data_generation').fetchone()[0] == 1
+
+        # the triggers added by the migrations keep the new tables in step
+        db.execute("INSERT INTO comments (author_id, post_id, body) VALUES (2, 2, 'new')")
+        db.commit()
+        assert db.execute('SELECT comments_count FROM post WHERE id = 2').fetchone()[0] == 1
+
+
+def test_steps_can_run_again(app):
+    # databases made from schema.sql before the migrations have version 0
+    with app.app_context():
+        db = get_db()
+        db.execute('PRAGMA user_version = 0')
+        posts = db.execute('SELECT COUNT(1) FROM post').fetchone()[0]
+        assert len(upgrade_db()) == LATEST_VERSION
+        assert db.execute('SELECT COUNT(1) FROM post').fetchone()[0] == posts
+        assert db.execute('SELECT COUNT(1) FROM data_generation').fetchone()[0] == 1
+        assert db.execute('SELECT COUNT(1) FROM tag_catalog_version').fetchone()[0] == 1
+        assert verify_counters() == []
+
+
+def test_newer_database(app):
+    with app.app_context():
+        get_db().execute('PRAGMA user_version = {}'.format(LATEST_VERSION + 1))
+        with pytest.raises(RuntimeError):
+            upgrade_db()
+
+
+def test_db_upgrade_command(app, runner):
+    with app.app_context():
+        get_db().execute('PRAGMA user_version = 5')
+
+    result = runner.invoke(args=['db-upgrade', '--dry-run'])
+    assert '6: ' in result.output and '4: ' not in result.output
+    assert 'version 5 of {}'.format(LATEST_VERSION) in result.output
+
+    result = runner.invoke(args=['db-upgrade'])
+    assert 'Applied 7: ' in result.output
+    assert 'Applied 5: ' not in result.output
+    with app.app_context():
+        assert get_schema_version() == LATEST_VERSION
+
+
+def test_legacy_icons(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'POST_IMAGES_FOLDER', str(tmp_path))
+    png = b'\x89PNG\r\n\x1a\n' + b'\0' * 32
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post (title, body, tags, topic_id, author_id, icon) VALUES ('png', '', '', 1, 1, ?)",
+                   (png,))
+        db.execute("INSERT INTO post (title, body, tags, topic_id, author_id, icon) VALUES ('junk', '', '', 1, 1, ?)",
+                   (b'junk',))
+        db.execute('PRAGMA user_version = 8')
+        assert [number for (number, description) in upgrade_db()] == [9]
+
+        icons = dict(db.execute('SELECT title, icon FROM post').fetchall())
+        assert icons['junk'] is None
+        assert icons['png'].endswith('_thumb.png')
+        path = os.path.join(str(tmp_path), APP_CONFIG['IMAGE_DERIVATIVES_FOLDER'], icons['png'])
+        with open(path, 'rb') as f:
+            assert f.read() == png
@@ -0,0 +1,94 @@
+from flaskr.cache import LRUCache
+from flaskr.db import get_db
+from flaskr.pagecache import get_data_generation, get_page_cache_stats
+
+
+def test_anonymous_pages_cached(client):
+    assert client.get('/1/detail').headers['X-Cache'] == 'MISS'
+    response = client.get('/1/detail')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert b'test title' in response.data
+    # other arguments are another page
+    assert client.get('/1/detail?x=1').headers['X-Cache'] == 'MISS'
+    assert get_page_cache_stats()['hits'] >= 1
+
+
+def test_writes_invalidate_pages(client, app):
+    client.get('/1/detail')
+    with app.app_context():
+        generation = get_data_generation()
+        get_db().execute("UPDATE post SET title = 'changed' WHERE id = 1")
+        get_db().commit()
+    response = client.get('/1/detail')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'changed' in response.data
+    with app.app_context():
+        assert get_data_generation() != generation
+
+
+def test_logged_in_pages_not_cached(client, auth):
+    auth.login()
+    client.get('/')
+    assert 'X-Cache' not in client.get('/').headers
+
+
+def test_cache_size_budget():
+    cache = LRUCache(10, weigh=len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    cache.get('a')
+    cache.put('c', 'xxxx')
+    # 'b' was the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xxxx'
+    assert cache.get_stats()['weight'] == 8
+    cache.put('big', 'x' * 11)
+    assert cache.get('big') is None
+
+
+def test_detail_not_modified(client, app):
+    # the fixture post is rendered, and its body stamp stored, on first read
+    client.get('/1/detail')
+    response = client.get('/1/detail')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control']
+
+    response = client.get('/1/detail', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    # a new comment changes the version of the post
+    with app.app_context():
+        get_db().execute("INSERT INTO comments (author_id, post_id, body) VALUES (2, 1, 'new')")
+        get_db().commit()
+    assert client.get('/1/detail', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_feed_not_modified(client, auth):
+    etag = client.get('/').headers['ETag']
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+    # another visitor has another page
+    auth.login()
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_comment_changes_not_modified(client, app):
+    # an edit, or a delete and a new comment, leave the counters as they were
+    with app.app_context():
+        get_db().execute("INSERT INTO comments (author_id, post_id, body) VALUES (2, 1, 'first')")
+        get_db().commit()
+    for url in ('/1/detail', '/api/v1/posts/1/comments'):
+        etag = client.get(url).headers['ETag']
+        with app.app_context():
+            get_db().execute("UPDATE comments SET body = 'edited' WHERE post_id = 1")
+            get_db().commit()
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'edited' in response.data
+
+        etag = response.headers['ETag']
+        with app.app_context():
+            get_db().execute('DELETE FROM comments WHERE post_id = 1')
+            get_db().execute("INSERT INTO comments (author_id, post_id, body) VALUES (2, 1, 'first')")
+            get_db().commit()
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,63 @@
+import time
+
+from flaskr.db import get_db
+from flaskr.profiler import RowProfiledCursor, get_statement_shape
+
+
+def test_statement_shape():
+    assert get_statement_shape('SELECT *\n  FROM post WHERE id IN (?, ?, ?) LIMIT 10') == \
+        get_statement_shape('SELECT * FROM post WHERE id IN (?) LIMIT 20')
+
+
+def test_profile_headers(client, app):
+    app.config['SQL_PROFILE_HEADERS'] = True
+    response = client.get('/1/detail')
+    assert int(response.headers['X-SQL-Queries']) > 0
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+
+
+def test_repeated_and_slow_queries(client, app, caplog):
+    app.config['SQL_SLOW_QUERY_MS'] = 0
+    app.config['SQL_REPEATED_QUERIES'] = 2
+
+    @app.route('/n_plus_one')
+    def n_plus_one():
+        for id in (1, 2, 3):
+            get_db().execute('SELECT title FROM post WHERE id = ?', (id,)).fetchone()
+        return 'done'
+
+    client.get('/n_plus_one')
+    messages = [record.getMessage() for record in caplog.records]
+    assert any('Possible N+1 in /n_plus_one: 3 times' in message for message in messages)
+    assert any('Slow query' in message and 'SEARCH post' in message for message in messages)
+
+
+def test_fetch_time(client, app, caplog):
+    # each row takes 10 ms, execute only steps to the first one: the
+    # statement is slow with the time of looping over the rest
+    app.config['SQL_SLOW_QUERY_MS'] = 30
+    app.config['SQL_PROFILE_HEADERS'] = True
+    app.config['SQL_PROFILE_ROWS'] = True
+
+    @app.route('/slow_rows')
+    def slow_rows():
+        db = get_db()
+        db.create_function('pause', 1, lambda value: time.sleep(0.01) or value)
+        rows = [row[0] for row in db.execute('SELECT pause(column1) FROM (VALUES (1), (2), (3), (4), (5))')]
+        return str(len(rows))
+
+    response = client.get('/slow_rows')
+    assert float(response.headers['Server-Timing'].split(';')[1][4:]) >= 50
+    assert any('Slow query' in record.getMessage() and 'pause' in record.getMessage()
+               for record in caplog.records)
+
+
+def test_rows_not_timed_by_default(client, app):
+    # outside debug mode a loop over a cursor runs at full speed
+    @app.route('/cursor_type')
+    def cursor_type():
+        return type(get_db().execute('SELECT 1')).__name__
+
+    assert client.get('/cursor_type').data != RowProfiledCursor.__name__.encode()
+    app.config['SQL_PROFILE_ROWS'] = True
+    assert client.get('/cursor_type').data == RowProfiledCursor.__name__.encode()
@@ -0,0 +1,64 @@
+from flaskr import render
+from flaskr.db import get_db
+from flaskr.render import (
+    RENDERER_VERSION, render_body, get_body_html, get_body_stamp, render_all_bodies
+)
+
+
+def test_render_body():
+    (html, stamp) = render_body('```\ncode\n```')
+    assert '<code>code' in html
+    assert stamp.startswith(RENDERER_VERSION + ':')
+    assert render_body('other')[1] != stamp
+
+
+def test_body_html_rendered_on_read(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT body_html FROM post WHERE id = 1').fetchone()[0] is None
+        assert get_body_html(1, None) == '<p>test\nbody</p>'
+        post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
+        assert post['body_html'] == '<p>test\nbody</p>'
+
+        # a body changed by raw SQL is rendered again
+        db.execute("UPDATE post SET body = '*new*' WHERE id = 1")
+        db.commit()
+        stamp = db.execute('SELECT body_html_version FROM post WHERE id = 1').fetchone()[0]
+        assert stamp is None
+        assert get_body_html(1, stamp) == '<p><em>new</em></p>'
+
+
+def test_update_renders_body(client, auth, app):
+    auth.login()
+    client.post('/1/update', data={
+        'title': 'updated', 'body': '**bold**', 'tags': '#test', 'topic': 1, 'file': (None, '')
+    })
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post WHERE id = 1').fetchone()
+        assert post['body_html'] == '<p><strong>bold</strong></p>'
+    assert b'<strong>bold</strong>' in client.get('/1/detail').data
+
+
+def test_render_posts_command(runner, app):
+    result = runner.invoke(args=['render-posts', '--workers', '1'])
+    assert 'Rendered 1 posts.' in result.output
+    result = runner.invoke(args=['render-posts', '--workers', '1'])
+    assert 'Rendered 0 posts.' in result.output
+    with app.app_context():
+        assert render_all_bodies(render_all=True, workers=1) == 1
+
+
+def test_html_of_another_body(app, monkeypatch):
+    with app.app_context():
+        db = get_db()
+        # a late write stored the html of the body before an edit
+        db.execute("UPDATE post SET body = 'new', body_html = '<p>old</p>', body_html_version = ? WHERE id = 1",
+                   (get_body_stamp('old'),))
+        db.commit()
+        stamp = db.execute('SELECT body_html_version FROM post WHERE id = 1').fetchone()[0]
+        assert get_body_html(1, stamp) == '<p>new</p>'
+
+        # a batch rendered before the edit doesn't overwrite it
+        monkeypatch.setattr(render, 'get_body_batches', lambda render_all, batch_size: iter([[(1, 'old')]]))
+        assert render_all_bodies(render_all=True, workers=1) == 0
+        assert db.execute('SELECT body_html FROM post WHERE id = 1').fetchone()[0] == '<p>new</p>'
@@ -0,0 +1,66 @@
+import pytest
+from flaskr.db import get_db
+from flaskr.search import build_match_query, search_posts, get_amount_of_search_results
+
+
+@pytest.mark.parametrize(('text', 'query'), (
+    ('flask', '"flask"*'),
+    ('flask blog', '"flask" "blog"*'),
+    ('#python "quoted', '"python" """quoted"*'),
+    ('   ', None),
+))
+def test_build_match_query(text, query):
+    assert build_match_query(text) == query
+
+
+def test_search_follows_writes(app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, tags, topic_id, author_id)"
+            " VALUES ('Flask tips', 'use <b>blueprints</b>', '#python', 1, 1)"
+        )
+        db.commit()
+        posts = search_posts('blueprints')
+        assert [post['title'] for post in posts] == ['Flask tips']
+        assert '<mark>blueprints</mark>' in posts[0]['snippet']
+        assert '&lt;b&gt;' in posts[0]['snippet']
+        assert get_amount_of_search_results('python') == 1
+
+        db.execute("UPDATE post SET title = 'Django tips' WHERE title = 'Flask tips'")
+        assert search_posts('flask') == []
+        assert len(search_posts('django')) == 1
+
+        db.execute("DELETE FROM post WHERE title = 'Django tips'")
+        assert search_posts('django') == []
+
+
+def test_search_ranks_title_first(app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, tags, topic_id, author_id)"
+            " VALUES ('other', 'a post about sqlite', '#db', 1, 1),"
+            " ('sqlite', 'a post', '#db', 1, 1)"
+        )
+        assert [post['title'] for post in search_posts('sqlite')] == ['sqlite', 'other']
+
+
+def test_filter_title(client):
+    response = client.get('/filter_title?title_to_find=body')
+    assert b'<mark>body</mark>' in response.data
+    response = client.get('/filter_title?title_to_find=')
+    assert response.headers['Location'] == 'http://localhost/index'
+
+
+def test_rebuild_search_command(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post_search (post_search) VALUES ('delete-all')")
+        db.commit()
+        assert search_posts('test') == []
+
+    result = runner.invoke(args=['rebuild-search'])
+    assert 'Rebuilt' in result.output
+    with app.app_context():
+        assert len(search_posts('test')) == 1
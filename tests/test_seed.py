@@ -0,0 +1,17 @@
+from flaskr.counters import verify_counters
+from flaskr.db import get_db
+
+
+def test_seed_db_command(runner, app):
+    result = runner.invoke(args=['seed-db', '--posts', '200', '--topics', '3'])
+    assert 'Seeded 200 posts, 10 users and 3 topics.' in result.output
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT COUNT(1) FROM post').fetchone()[0] == 201
+        assert db.execute('SELECT COUNT(1) FROM post_tags').fetchone()[0] > 200
+        assert db.execute('SELECT COUNT(1) FROM votes').fetchone()[0] > 0
+        # some comments are replies
+        assert db.execute('SELECT COUNT(1) FROM comments WHERE repplied_to != 0').fetchone()[0] > 0
+        assert db.execute("SELECT COUNT(1) FROM post_search WHERE post_search MATCH 'flask'").fetchone()[0] > 0
+        assert verify_counters() == []
@@ -0,0 +1,92 @@
+import pytest
+from flaskr.db import get_db
+from flaskr.tags import (
+    parse_tags, get_posts_by_tags, get_amount_of_posts_by_tags, backfill_post_tags,
+    get_tag_catalog
+)
+
+
+@pytest.mark.parametrize(('text', 'tags'), (
+    ('#a #b#a', ['a', 'b']),
+    ('a#b', ['b']),
+    ('', []),
+    (None, []),
+))
+def test_parse_tags(text, tags):
+    assert parse_tags(text) == tags
+
+
+def add_tagged_posts(app):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, tags, topic_id, author_id, created)'
+            ' VALUES (?, ?, ?, 1, 1, ?)',
+            [('py', 'body', '#py', '2019-01-01 00:00:01'),
+             ('python', 'body', '#python#flask', '2019-01-01 00:00:02'),
+             ('both', 'body', '#py #flask', '2019-01-01 00:00:03')]
+        )
+        db.commit()
+
+
+def test_posts_by_tags(app):
+    add_tagged_posts(app)
+    with app.app_context():
+        assert [p['title'] for p in get_posts_by_tags(['py'])] == ['both', 'py']
+        assert [p['title'] for p in get_posts_by_tags(['py', 'flask'])] == ['both', 'python', 'py']
+        assert [p['title'] for p in get_posts_by_tags(['py', 'flask'], match_all=True)] == ['both']
+        assert get_amount_of_posts_by_tags(['py', 'flask'], match_all=True) == 1
+        assert [p['title'] for p in get_posts_by_tags(['flask'], limit=1, offset=1)] == ['python']
+
+
+def test_post_tags_follow_writes(app):
+    add_tagged_posts(app)
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET tags = '#other' WHERE title = 'both'")
+        db.execute("DELETE FROM post WHERE title = 'py'")
+        assert [p['title'] for p in get_posts_by_tags(['py'])] == []
+        assert [p['title'] for p in get_posts_by_tags(['other'])] == ['both']
+
+
+def test_backfill_post_tags(app, runner):
+    add_tagged_posts(app)
+    with app.app_context():
+        db = get_db()
+        db.execute('DELETE FROM post_tags')
+        db.commit()
+        assert backfill_post_tags() == 6
+
+    result = runner.invoke(args=['backfill-tags'])
+    assert 'Indexed 6 post tags.' in result.output
+
+
+def test_filter_tag(client, app):
+    add_tagged_posts(app)
+    response = client.get('/filter_tag?multiple_tags=%23py%23flask&match=all')
+    assert b'<h1>both</h1>' in response.data
+    assert b'<h1>python</h1>' not in response.data
+    response = client.get('/filter_tag?multiple_tags=')
+    assert response.headers['Location'] == 'http://localhost/index'
+
+
+def test_tag_catalog(app):
+    add_tagged_posts(app)
+    with app.app_context():
+        assert get_tag_catalog() == [('#flask', 2), ('#py', 2), ('#python', 1), ('#test', 1)]
+
+        db = get_db()
+        db.execute("DELETE FROM post WHERE title = 'python'")
+        db.execute("UPDATE post SET tags = '#py' WHERE title = 'both'")
+        assert get_tag_catalog() == [('#py', 2), ('#test', 1)]
+
+
+def test_tag_catalog_cache(app):
+    with app.app_context():
+        assert get_tag_catalog() == [('#test', 1)]
+        db = get_db()
+        # a change of the table alone is not seen until the version changes
+        db.execute("UPDATE tag_catalog SET posts = 9")
+        assert get_tag_catalog() == [('#test', 1)]
+        db.execute("UPDATE tag_catalog_version SET version = version + 1")
+        assert get_tag_catalog() == [('#test', 9)]
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+from flaskr.counters import verify_counters
+from flaskr.db import get_db, init_db
+from flaskr.migrations import upgrade_db
+from flaskr.seed import seed_database
+from flaskr.transfer import (
+    COLUMNS, KEPT_TRIGGERS, copy_images, defer_indexes_and_triggers, export_data, import_rows, read_csv,
+    read_jsonl)
+
+
+def get_snapshot(db):
+    return {table: [tuple(row) for row in db.execute(
+                'SELECT {} FROM {} ORDER BY 1, 2'.format(', '.join(columns), table))]
+            for (table, columns) in COLUMNS.items()}
+
+
+def get_schema(db):
+    return sorted(tuple(row) for row in db.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+
+
+@pytest.mark.parametrize('file_format', ('jsonl', 'csv'))
+def test_export_import(app, tmp_path, file_format):
+    path = str(tmp_path / 'export')
+    with app.app_context():
+        seed_database(posts=50, comments_per_post=2)
+        db = get_db()
+        db.execute('UPDATE post SET icon = NULL WHERE id = 1')
+        # the image bytes of a legacy icon
+        db.execute('UPDATE post SET icon = ? WHERE id = 2', (b'\x89PNG\r\n\x00"\n',))
+        db.commit()
+        before = get_snapshot(db)
+        schema = get_schema(db)
+        amounts = export_data(path, file_format)
+        assert amounts['post'] == 51
+
+        init_db()
+        read = read_jsonl if file_format == 'jsonl' else read_csv
+        imported = import_rows(read(path), batch_size=7, transaction_size=20)
+        assert imported['post'] == (51, 51)
+
+        assert get_snapshot(db) == before
+        # the indexes and triggers are back, with all they maintain
+        assert get_schema(db) == schema
+        assert verify_counters() == []
+        assert db.execute('SELECT COUNT(1) FROM post_tags').fetchone()[0] >= 51
+        assert db.execute("SELECT COUNT(1) FROM post_search WHERE post_search MATCH 'test'").fetchone()[0] == 1
+
+        # the same rows again are skipped
+        imported = import_rows(read(path))
+        assert imported['post'] == (51, 0)
+
+
+def test_import_unknown_table(app, tmp_path, runner):
+    path = tmp_path / 'bad.jsonl'
+    path.write_text(json.dumps({'table': 'likes', 'id': 1}) + '\n')
+    result = runner.invoke(args=['import', str(path)])
+    assert 'Unknown table' in result.output
+    with app.app_context():
+        # the deferred triggers are restored after a failure too
+        assert any(kind == 'trigger' for (kind, name) in get_schema(get_db()))
+
+
+def test_interrupted_import(app):
+    with app.app_context():
+        db = get_db()
+        schema = get_schema(db)
+        # the import process is killed after dropping them
+        defer_indexes_and_triggers(db)
+        kept = get_schema(db)
+        assert ('index', 'post_created') not in kept
+        assert {('trigger', name) for name in KEPT_TRIGGERS} <= set(kept)
+
+        db.execute("INSERT INTO comments (author_id, post_id, body) VALUES (1, 1, 'during')")
+        db.commit()
+        upgrade_db()
+        assert get_schema(db) == schema
+        assert db.execute('SELECT COUNT(1) FROM deferred_schema').fetchone()[0] == 0
+        assert verify_counters() == []
+
+
+def test_export_command(runner, tmp_path):
+    path = tmp_path / 'export.jsonl'
+    result = runner.invoke(args=['export', str(path)])
+    assert 'Exported 1 rows of post.' in result.output
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [row['table'] for row in rows] == ['user', 'user', 'topics', 'post']
+    assert rows[3]['created'] == '2018-01-01 00:00:00'
+
+
+def test_copy_images(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'derived').mkdir(parents=True)
+    (source / 'a.png').write_bytes(b'a')
+    (source / 'derived' / 'a_thumb.png').write_bytes(b'thumb')
+    target = tmp_path / 'target'
+
+    names = ['a.png', 'derived/a_thumb.png', 'missing.png']
+    assert copy_images(names, str(source), str(target), workers=2) == 2
+    assert (target / 'derived' / 'a_thumb.png').read_bytes() == b'thumb'
+    # files already there are not copied again
+    assert copy_images(names, str(source), str(target)) == 0
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+from flaskr.counters import verify_counters
+from flaskr.db import get_db
+from flaskr.votes import get_user_vote, migrate_votes
+
+
+def get_counts(app):
+    with app.app_context():
+        post = get_db().execute('SELECT likes_count, dislikes_count FROM post WHERE id = 1').fetchone()
+        return tuple(post)
+
+
+def test_toggle_votes(client, auth, app):
+    auth.login()
+    client.get('/1/like')
+    assert get_counts(app) == (1, 0)
+    # a dislike replaces the like, a user can't do both
+    client.get('/1/dislike')
+    assert get_counts(app) == (0, 1)
+    # the same vote again takes it back
+    client.get('/1/dislike')
+    assert get_counts(app) == (0, 0)
+
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(1) FROM votes').fetchone()[0] == 1
+        assert get_user_vote(1, 1) == 0
+        assert verify_counters() == []
+
+
+def test_one_vote_per_user(app):
+    with app.app_context():
+        db = get_db()
+        db.execute('INSERT INTO votes (post_id, author_id, value) VALUES (1, 1, 1)')
+        with pytest.raises(sqlite3.IntegrityError):
+            db.execute('INSERT INTO votes (post_id, author_id, value) VALUES (1, 1, -1)')
+
+
+def test_migrate_votes(app, runner):
+    with app.app_context():
+        db = get_db()
+        db.executescript("""
+            DROP TABLE votes;
+            CREATE TABLE likes (id INTEGER PRIMARY KEY, author_id INTEGER, post_id INTEGER);
+            CREATE TABLE dislikes (id INTEGER PRIMARY KEY, author_id INTEGER, post_id INTEGER);
+            INSERT INTO likes (author_id, post_id) VALUES (1, 1), (1, 1), (2, 1);
+            INSERT INTO dislikes (author_id, post_id) VALUES (2, 1);
+            UPDATE post SET likes_count = 3, dislikes_count = 1;
+        """)
+
+    result = runner.invoke(args=['migrate-votes'])
+    assert 'Migrated 2 votes.' in result.output
+
+    with app.app_context():
+        assert get_user_vote(1, 1) == 1
+        assert get_user_vote(1, 2) == 0
+        assert verify_counters() == []
+        assert migrate_votes() == 0
+    assert get_counts(app) == (1, 0)
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import pytest
+from flaskr.db import get_db
+from flaskr.writer import Writer, WriteQueueFull, get_writer, write, execute_write
+
+
+def test_execute_write(app):
+    with app.app_context():
+        post_id = execute_write(
+            "INSERT INTO post (title, body, tags, topic_id, author_id)"
+            " VALUES ('queued', 'body', '#test', 1, 1)")
+        assert get_db().execute('SELECT title FROM post WHERE id = ?', (post_id,)).fetchone()[0] == 'queued'
+
+
+def test_failed_job_is_isolated(app):
+    def fail(db):
+        db.execute("UPDATE post SET title = 'rolled back'")
+        raise ValueError('broken job')
+
+    with app.app_context():
+        writer = get_writer()
+        failed = writer.submit(fail)
+        done = writer.submit(lambda db: db.execute("UPDATE post SET body = 'kept'").rowcount)
+        with pytest.raises(ValueError):
+            failed.result()
+        assert done.result() == 1
+        post = get_db().execute('SELECT title, body FROM post').fetchone()
+        assert tuple(post) == ('test title', 'kept')
+        assert writer.get_stats()['failed'] == 1
+
+
+def test_group_commit(app):
+    release = threading.Event()
+
+    with app.app_context():
+        writer = get_writer()
+        # hold the writer so the next jobs queue up behind this one
+        first = writer.submit(lambda db: release.wait(5))
+        futures = [writer.submit(lambda db: db.execute('SELECT 1')) for i in range(10)]
+        release.set()
+        first.result()
+        [future.result() for future in futures]
+        stats = writer.get_stats()
+    assert stats['jobs'] == 11
+    assert stats['batches'] < 11
+
+
+def test_queue_full(app):
+    release = threading.Event()
+    writer = Writer(app.config['DATABASE'], batch_size=1, queue_size=1, queue_timeout=0.01)
+    try:
+        writer.submit(lambda db: release.wait(5))
+        # the writer holds the first job, one more fits in the queue
+        with pytest.raises(WriteQueueFull):
+            for i in range(3):
+                writer.submit(lambda db: None)
+    finally:
+        release.set()
+        writer.stop()
+
+
+def test_request_connection_is_read_only(app):
+    with app.test_request_context():
+        with pytest.raises(sqlite3.OperationalError) as e:
+            get_db().execute("UPDATE post SET title = 'direct'")
+        assert 'readonly' in str(e.value)
+        write(lambda db: db.execute("UPDATE post SET title = 'queued'"))
+        assert get_db().execute('SELECT title FROM post').fetchone()[0] == 'queued'